@@ -1,31 +1,1207 @@
-from datetime import datetime, timedelta
+import time
+STARTUP_STARTED = time.perf_counter()
+
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 import os
+import re
+import gzip
 import json
-import urllib.request
-from flask import Flask, render_template, request, redirect, url_for
-import gspread
-from google.oauth2.service_account import Credentials
+import hmac
+import hashlib
+import functools
+import heapq
+import itertools
+import random
+import secrets
+import sqlite3
+import threading
+import http.client
+import subprocess
+import sys
+import click
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from urllib.parse import urlsplit, quote
+from flask import Flask, request, redirect, url_for, jsonify, abort, make_response, g, has_request_context, send_from_directory
+from flask import render_template as flask_render_template
+from markupsafe import escape
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# gspread and google-auth are imported where they're first used. Together they
+# pull in requests and the OAuth stack, which cold starts shouldn't pay for on
+# routes that never touch Sheets.
+
+# --- STARTUP ---
+# Cold-start timings in seconds: module imports, template compilation, the whole
+# module load, and the first request served. STARTUP_TIMING=1 prints them too.
+STARTUP_TIMING = os.environ.get('STARTUP_TIMING') == '1'
+startup_timings = {'imports': time.perf_counter() - STARTUP_STARTED}
 
 app = Flask(__name__, template_folder='../templates')
 
+# --- INSTRUMENTATION ---
+# Every Sheets, OAuth, Brevo and template-render call is timed. Totals per
+# request go out in a Server-Timing header; process-wide histograms and
+# counters are served in Prometheus format from /metrics.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+_metrics_lock = threading.Lock()
+route_latency = defaultdict(Histogram)
+external_latency = defaultdict(Histogram)
+external_errors = Counter()
+
+def record_external(kind, seconds, error=None):
+    with _metrics_lock:
+        external_latency[kind].observe(seconds)
+        if error:
+            external_errors[(kind, error)] += 1
+    if has_request_context():
+        timings = g.setdefault('external_timings', {})
+        calls, total = timings.get(kind, (0, 0.0))
+        timings[kind] = (calls + 1, total + seconds)
+
+@contextmanager
+def timed(kind):
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        status = getattr(getattr(e, 'response', None), 'status_code', None) or getattr(e, 'status', None)
+        error = str(status or type(e).__name__)
+        raise
+    finally:
+        record_external(kind, time.perf_counter() - started, error)
+
+def render_template(template_name, **context):
+    with timed('render'):
+        return flask_render_template(template_name, **context)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    with _metrics_lock:
+        route_latency[(route, request.method, response.status_code)].observe(elapsed)
+        first_request = 'first_request' not in startup_timings
+        if first_request:
+            startup_timings['first_request'] = elapsed
+    if first_request and STARTUP_TIMING:
+        print(f"Startup: first request {request.method} {request.path} took {elapsed * 1000:.1f}ms")
+    entries = [
+        f'{kind};dur={total * 1000:.1f};desc="{calls} call{"" if calls == 1 else "s"}"'
+        for kind, (calls, total) in sorted(g.get('external_timings', {}).items())
+    ]
+    entries.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+# --- SHEETS CLIENT ---
+# One authorized client per process. Warm Vercel instances reuse the session
+# (and its connection pool) instead of re-authorizing on every get_sheet().
+SHEETS_SCOPE = ['https://www.googleapis.com/auth/spreadsheets']
+TOKEN_CACHE_PATH = os.environ.get('GOOGLE_TOKEN_CACHE_PATH', '/tmp/aiara_sheets_token.json')
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+_sheets_lock = threading.Lock()
+_sheets_creds = None
+_sheets_client = None
+_sheets_spreadsheet = None
+_sheets_saved_token = None
+_token_request = None
+
+def _utcnow():
+    # google-auth keeps token expiry as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _token_is_fresh(creds):
+    return bool(creds.token and creds.expiry and creds.expiry - TOKEN_REFRESH_MARGIN > _utcnow())
+
+def _load_cached_token(creds):
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            cached = json.load(f)
+        if cached.get('account') != creds.service_account_email:
+            return
+        creds.token = cached['token']
+        creds.expiry = datetime.fromisoformat(cached['expiry'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+def _save_cached_token(creds):
+    global _sheets_saved_token
+    if creds.token == _sheets_saved_token:
+        return
+    try:
+        tmp_path = f"{TOKEN_CACHE_PATH}.{os.getpid()}"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'account': creds.service_account_email,
+                'token': creds.token,
+                'expiry': creds.expiry.isoformat()
+            }, f)
+        os.replace(tmp_path, TOKEN_CACHE_PATH)
+        _sheets_saved_token = creds.token
+    except OSError as e:
+        print(f"Token Cache Error: {e}")
+
+def _refresh_token_if_needed(creds):
+    global _token_request
+    if not _token_is_fresh(creds):
+        if _token_request is None:
+            from google.auth.transport.requests import Request as GoogleAuthRequest
+            _token_request = GoogleAuthRequest()
+        with timed('oauth'):
+            creds.refresh(_token_request)
+    # The client session also refreshes on its own, so persist whatever it holds now
+    _save_cached_token(creds)
+
+def _instrument_sheets_client(client):
+    # All Sheets API traffic goes through the client's HTTP request method
+    http_client = getattr(client, 'http_client', client)
+    send = http_client.request
+
+    def scheduled_request(method, endpoint, *args, **kwargs):
+        return sheets_scheduler.request(send, method, endpoint, *args, **kwargs)
+
+    http_client.request = scheduled_request
+
 def get_sheet():
-    info = json.loads(os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON'))
-    scope = ['https://www.googleapis.com/auth/spreadsheets']
-    creds = Credentials.from_service_account_info(info, scopes=scope)
-    client = gspread.authorize(creds)
-    return client.open_by_key(os.environ.get('GOOGLE_SHEET_ID'))
+    global _sheets_creds, _sheets_client, _sheets_spreadsheet
+    with _sheets_lock:
+        if _sheets_spreadsheet is None:
+            import gspread
+            from google.oauth2.service_account import Credentials
+            info = json.loads(os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON'))
+            creds = Credentials.from_service_account_info(info, scopes=SHEETS_SCOPE)
+            _load_cached_token(creds)
+            _refresh_token_if_needed(creds)
+            client = gspread.authorize(creds)
+            _instrument_sheets_client(client)
+            _sheets_spreadsheet = client.open_by_key(os.environ.get('GOOGLE_SHEET_ID'))
+            _sheets_creds, _sheets_client = creds, client
+        else:
+            _refresh_token_if_needed(_sheets_creds)
+        return _sheets_spreadsheet
+
+# --- SHEETS SCHEDULER ---
+# Every Sheets API call waits its turn for a token from a bucket sized to the
+# per-minute quota, so a burst queues here instead of coming back as 429s.
+# Writes (order and subscriber appends) are served before reads. Identical
+# GETs already in flight share one response. Reads are retried on 429/5xx with
+# jittered exponential backoff. Writes are retried only on 429, which Sheets
+# sends before doing anything; after a 5xx the write may have gone through, so
+# the caller decides. SHEETS_QUOTA_PER_MINUTE=0 disables the bucket.
+SHEETS_QUOTA_PER_MINUTE = float(os.environ.get('SHEETS_QUOTA_PER_MINUTE', '60'))
+SHEETS_BURST = int(os.environ.get('SHEETS_BURST', '10'))
+SHEETS_MAX_RETRIES = int(os.environ.get('SHEETS_MAX_RETRIES', '4'))
+SHEETS_BACKOFF_SECONDS = float(os.environ.get('SHEETS_BACKOFF_SECONDS', '1'))
+SHEETS_BACKOFF_MAX = 16
+SHEETS_WRITE_PRIORITY = 0
+SHEETS_READ_PRIORITY = 1
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                if self._take(tokens):
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            return self._take(tokens)
+
+    def _take(self, tokens):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+class SheetsFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+class SheetsScheduler:
+    def __init__(self, quota_per_minute, burst, max_retries):
+        self.bucket = TokenBucket(quota_per_minute / 60, burst) if quota_per_minute else None
+        self.max_retries = max_retries
+        self._turns = threading.Condition()
+        self._queue = []
+        self._tickets = itertools.count()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.counts = Counter()
+
+    def request(self, send, method, endpoint, *args, **kwargs):
+        if method.lower() != 'get':
+            return self._send(SHEETS_WRITE_PRIORITY, send, method, endpoint, *args, **kwargs)
+
+        key = (endpoint, repr(args), repr(kwargs.get('params')))
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = SheetsFlight()
+        if not leader:
+            self.counts['coalesced'] += 1
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            response = self._send(SHEETS_READ_PRIORITY, send, method, endpoint, *args, **kwargs)
+            # Read the body now so the followers don't race to consume the stream
+            getattr(response, 'content', None)
+            flight.response = response
+            return response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _wait_turn(self, priority):
+        started = time.perf_counter()
+        ticket = (priority, next(self._tickets))
+        with self._turns:
+            heapq.heappush(self._queue, ticket)
+            while self._queue[0] != ticket:
+                self._turns.wait()
+        try:
+            if self.bucket:
+                self.bucket.acquire()
+        finally:
+            with self._turns:
+                heapq.heappop(self._queue)
+                self._turns.notify_all()
+        record_external('sheets_queue', time.perf_counter() - started)
+
+    def _send(self, priority, send, method, endpoint, *args, **kwargs):
+        for attempt in itertools.count():
+            self._wait_turn(priority)
+            try:
+                with timed('sheets'):
+                    return send(method, endpoint, *args, **kwargs)
+            except Exception as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                retryable = status == 429 or (priority == SHEETS_READ_PRIORITY and (status or 0) >= 500)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                self.counts['retries'] += 1
+                time.sleep(random.uniform(0, min(SHEETS_BACKOFF_MAX, SHEETS_BACKOFF_SECONDS * 2 ** attempt)))
+
+    def stats(self):
+        with self._turns:
+            queued = len(self._queue)
+        return dict(self.counts, queued=queued, quota_per_minute=SHEETS_QUOTA_PER_MINUTE)
+
+sheets_scheduler = SheetsScheduler(SHEETS_QUOTA_PER_MINUTE, SHEETS_BURST, SHEETS_MAX_RETRIES)
+
+_worksheets = {}
+
+def get_worksheet(name):
+    # Each Spreadsheet.worksheet() call re-fetches metadata; the handle itself doesn't change
+    sheet = get_sheet()
+    if name not in _worksheets:
+        _worksheets[name] = sheet.worksheet(name)
+    return _worksheets[name]
+
+# --- SHEET CACHE ---
+# Menu and Settings are read on nearly every page view. Entries are served from
+# memory for SHEET_CACHE_TTL seconds, then served stale while one background
+# refresh runs. After SHEET_CACHE_MAX_STALE seconds a caller waits for fresh data.
+SHEET_CACHE_TTL = float(os.environ.get('SHEET_CACHE_TTL', '60'))
+SHEET_CACHE_MAX_STALE = float(os.environ.get('SHEET_CACHE_MAX_STALE', '900'))
+
+class SheetCache:
+    def __init__(self, loader, ttl, max_stale):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._loading = {}
+        self._generation = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get(self, *names):
+        now = time.monotonic()
+        result, missing, stale = {}, [], []
+        with self._lock:
+            for name in names:
+                entry = self._entries.get(name)
+                age = now - entry[1] if entry else None
+                if entry is None or age > self.max_stale:
+                    self.misses += 1
+                    missing.append(name)
+                    continue
+                result[name] = entry[0]
+                if age <= self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    if name not in self._loading:
+                        self._loading[name] = threading.Event()
+                        stale.append(name)
+        if stale:
+            threading.Thread(target=self._refresh, args=(stale,), daemon=True).start()
+        if missing:
+            result.update(self._load_missing(missing))
+        return result
+
+    def invalidate(self, *names):
+        with self._lock:
+            for name in names or list(self._entries):
+                self._entries.pop(name, None)
+                self._generation[name] = self._generation.get(name, 0) + 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'ttl_seconds': self.ttl,
+                'entries': {name: round(now - loaded_at, 1) for name, (_, loaded_at) in self._entries.items()}
+            }
+
+    def _load_missing(self, names):
+        to_load, to_wait = [], []
+        with self._lock:
+            for name in names:
+                if name in self._loading:
+                    to_wait.append(self._loading[name])
+                else:
+                    self._loading[name] = threading.Event()
+                    to_load.append(name)
+
+        result = self._load(to_load) if to_load else {}
+        for event in to_wait:
+            event.wait()
+
+        with self._lock:
+            for name in names:
+                if name not in result and name in self._entries:
+                    result[name] = self._entries[name][0]
+        # Whoever we waited on failed (or was invalidated); try again ourselves
+        still_missing = [name for name in names if name not in result]
+        if still_missing:
+            result.update(self._load_missing(still_missing))
+        return result
+
+    def _load(self, names):
+        with self._lock:
+            generations = {name: self._generation.get(name, 0) for name in names}
+        try:
+            data = self.loader(list(names))
+            loaded_at = time.monotonic()
+            with self._lock:
+                for name in names:
+                    if self._generation.get(name, 0) == generations[name]:
+                        self._entries[name] = (data[name], loaded_at)
+            return data
+        finally:
+            with self._lock:
+                for name in names:
+                    self._loading.pop(name).set()
+
+    def _refresh(self, names):
+        try:
+            self._load(names)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            print(f"Cache Refresh Error: {e}")
+            with self._lock:
+                self.refresh_errors += 1
+
+def _records_from_values(values):
+    # Same shape as Worksheet.get_all_records(): header-keyed, numericised, padded rows
+    from gspread.utils import numericise_all
+    if not values:
+        return []
+    header = values[0]
+    records = []
+    for row in values[1:]:
+        row = row + [''] * (len(header) - len(row))
+        records.append(dict(zip(header, numericise_all(row))))
+    return records
+
+def read_worksheets(names):
+    # One values:batchGet for every worksheet instead of worksheet() + get_all_records() each
+    ranges = [_quote_worksheet(name) for name in names]
+    response = get_sheet().values_batch_get(ranges)
+    value_ranges = response.get('valueRanges', [])
+    return {name: _records_from_values(vr.get('values', [])) for name, vr in zip(names, value_ranges)}
+
+def _load_cached_worksheets(names):
+    # Every Menu read also re-bases the inventory ledger on the sheet's Remaining column
+    generation = inventory.generation
+    data = read_worksheets(names)
+    if "Menu" in data:
+        inventory.observe_menu(data["Menu"], generation)
+    return data
+
+sheet_cache = SheetCache(_load_cached_worksheets, SHEET_CACHE_TTL, SHEET_CACHE_MAX_STALE)
+
+def get_records(*names):
+    return sheet_cache.get(*names)
+
+def _settings_from_records(records):
+    settings = {}
+    for i in records:
+        if i.get('Setting Name'):
+            settings[i['Setting Name']] = i['Value']
+    return settings
+
+def get_settings():
+    return _settings_from_records(get_records("Settings")["Settings"])
+
+def get_menu_page_data():
+    data = get_records("Menu", "Settings")
+    visible_items = [inventory.with_live_count(i) for i in data["Menu"] if i.get('Status') == 'Active']
+    settings = _settings_from_records(data["Settings"])
+
+    if settings.get('Pickup Windows'):
+        settings['window_list'] = [w.strip() for w in settings['Pickup Windows'].split(',')]
+
+    if settings.get('DC Pickup Windows'):
+        settings['dc_window_list'] = [w.strip() for w in settings['DC Pickup Windows'].split(',')]
+
+    if settings.get('WWS (Pickup) Info'):
+        settings['wws_window_list'] = [w.strip() for w in settings['WWS (Pickup) Info'].split(',')]
+
+    return visible_items, settings
+
+# --- LOCAL STORE ---
+# Small SQLite database on the instance's disk for work that has to survive a
+# crashed or recycled worker thread. On Vercel only /tmp is writable.
+LOCAL_DB_PATH = os.environ.get('LOCAL_DB_PATH', '/tmp/aiara_bakery.sqlite3')
+
+LOCAL_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    label TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    sent_at REAL,
+    message_id TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS email_outbox_due ON email_outbox (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS order_journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    row TEXT NOT NULL,
+    flush_id INTEGER,
+    flushed_at REAL
+);
+CREATE INDEX IF NOT EXISTS order_journal_pending ON order_journal (flushed_at, flush_id, created_at);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    campaign TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+    campaign TEXT NOT NULL,
+    email TEXT NOT NULL,
+    sent_at REAL NOT NULL,
+    message_id TEXT,
+    PRIMARY KEY (campaign, email)
+);
+CREATE TABLE IF NOT EXISTS order_flushes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    start_row INTEGER NOT NULL,
+    end_row INTEGER,
+    committed_at REAL
+);
+CREATE TABLE IF NOT EXISTS inventory_journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    item TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    flush_id INTEGER,
+    flushed_at REAL
+);
+CREATE INDEX IF NOT EXISTS inventory_journal_pending ON inventory_journal (flushed_at, flush_id, created_at);
+CREATE TABLE IF NOT EXISTS inventory_flushes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    remaining TEXT,
+    committed_at REAL
+);
+CREATE TABLE IF NOT EXISTS sheet_cursors (
+    worksheet TEXT PRIMARY KEY,
+    last_row INTEGER NOT NULL,
+    last_row_values TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS production_orders (
+    row INTEGER PRIMARY KEY,
+    ordered_at TEXT,
+    logistics TEXT NOT NULL,
+    pickup_window TEXT NOT NULL,
+    vip_size TEXT,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS production_orders_ordered_at ON production_orders (ordered_at);
+CREATE TABLE IF NOT EXISTS production_lines (
+    row INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS production_lines_row ON production_lines (row);
+"""
+
+_local_db = threading.local()
+_local_db_init_lock = threading.Lock()
+_local_db_ready = False
+
+def local_db():
+    global _local_db_ready
+    conn = getattr(_local_db, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(LOCAL_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        with _local_db_init_lock:
+            if not _local_db_ready:
+                conn.executescript(LOCAL_DB_SCHEMA)
+                _local_db_ready = True
+        _local_db.conn = conn
+    return conn
+
+@contextmanager
+def local_transaction():
+    conn = local_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+class WriteCounter:
+    # Counts rows committed to a local-store table so the request hook that
+    # finishes its leftovers can skip querying it while nothing's been written
+    # since it was last found empty. Under load every query costs a wait to get
+    # the GIL back.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        # count when the table was last found empty; None until then, as an
+        # earlier process on the instance may have left rows behind
+        self.settled = None
+
+    def wrote(self):
+        with self._lock:
+            self.count += 1
+
+# --- INVENTORY ---
+# Remaining for each Menu item, kept in memory so /submit can reserve stock
+# atomically and reject oversold orders without a Sheets round trip. Accepted
+# reservations (and releases, as negative quantities) go to inventory_journal
+# and are written back to Menu as one batch update, applied to the sheet's
+# current value so manual edits made in the meantime aren't overwritten. A
+# background flusher does that every INVENTORY_FLUSH_SECONDS; Vercel freezes it
+# between invocations, so requests also flush whatever it left behind. Like
+# order flushes, each write-back is recorded in inventory_flushes first: one
+# that fails with a 5xx or times out may still have been applied, so the next
+# flush checks Menu for it before subtracting anything again. Each instance
+# only sees its own reservations, so if the sheet has less left than this one
+# reserved, the difference was oversold; that's logged and counted in /metrics.
+INVENTORY_FLUSH_SECONDS = float(os.environ.get('INVENTORY_FLUSH_SECONDS', '5'))
+ORDER_LINE_PATTERN = re.compile(r'^\s*(\d+)\s*x\s+(.+?)\s*$')
+# Only a comma followed by the next "Nx " starts a new line; item names may have commas
+ORDER_LINE_SEPARATOR = re.compile(r',\s*(?=\d+\s*x\s)')
+
+def parse_order_summary(summary):
+    # "2x Sourdough, 1x Rye" -> [(2, "Sourdough"), (1, "Rye")]
+    lines = []
+    for part in ORDER_LINE_SEPARATOR.split(str(summary or '')):
+        match = ORDER_LINE_PATTERN.match(part)
+        if match:
+            lines.append((int(match.group(1)), match.group(2)))
+    return lines
+
+def _remaining_count(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+class OutOfStock(Exception):
+    pass
+
+class InventoryLedger:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._sheet_counts = None
+        # Reserved on this instance and not yet known to be on Menu; mirrors the journal
+        self._unflushed = None
+        self._flusher = None
+        self.writes = WriteCounter()
+        # Bumped after every write-back; Menu reads that started earlier are ignored
+        self.generation = 0
+        self.reservations = 0
+        self.rejections = 0
+        self.oversold = Counter()
+
+    def observe_menu(self, records, generation):
+        counts = {i['Item Name']: _remaining_count(i.get('Remaining')) for i in records if i.get('Item Name')}
+        with self._lock:
+            if generation == self.generation:
+                self._sheet_counts = counts
+
+    def _load_unflushed(self):
+        # Caller holds self._lock. Picks up what an earlier process on the instance left
+        if self._unflushed is None:
+            self._unflushed = Counter({row['item']: row['quantity'] for row in local_db().execute(
+                "SELECT item, SUM(quantity) AS quantity FROM inventory_journal WHERE flushed_at IS NULL GROUP BY item"
+            )})
+
+    def _available(self, name):
+        return self._sheet_counts[name] - self._unflushed[name]
+
+    def available(self, name):
+        with self._lock:
+            if self._sheet_counts is None or name not in self._sheet_counts:
+                return None
+            self._load_unflushed()
+            return self._available(name)
+
+    def with_live_count(self, item):
+        count = self.available(item.get('Item Name'))
+        return item if count is None else dict(item, Remaining=count)
+
+    def _journal(self, quantities):
+        now = time.time()
+        with local_transaction() as db:
+            db.executemany(
+                "INSERT INTO inventory_journal (created_at, item, quantity) VALUES (?, ?, ?)",
+                [(now, name, qty) for name, qty in quantities.items()]
+            )
+        self.writes.wrote()
+
+    def reserve(self, lines):
+        if self._sheet_counts is None:
+            get_records("Menu")
+        wanted = Counter()
+        for qty, name in lines:
+            wanted[name] += qty
+        with self._lock:
+            self._load_unflushed()
+            for name, qty in wanted.items():
+                if name not in self._sheet_counts:
+                    self.rejections += 1
+                    raise OutOfStock(f"{name} is no longer on the menu.")
+                left = self._available(name)
+                if qty > left:
+                    self.rejections += 1
+                    raise OutOfStock(f"Only {max(left, 0)} {name} left." if left > 0 else f"{name} is sold out.")
+            self._unflushed.update(wanted)
+            self.reservations += 1
+        if wanted:
+            try:
+                self._journal(wanted)
+            except Exception:
+                # Not journaled, so never written back; don't hold the stock for it
+                with self._lock:
+                    self._unflushed.subtract(wanted)
+                raise
+            self.start_flusher()
+        return wanted
+
+    def release(self, reservation):
+        # If a flush already took the reservation, this one adds it back to Menu
+        if not reservation:
+            return
+        try:
+            self._journal(Counter({name: -qty for name, qty in reservation.items()}))
+        except sqlite3.Error as e:
+            print(f"Inventory Journal Error: {e}")
+            return
+        with self._lock:
+            self._unflushed.subtract(reservation)
+
+    def start_flusher(self):
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(INVENTORY_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Inventory Flush Error: {e}")
+
+    def unflushed_since(self):
+        # created_at of the oldest reservation not yet on Menu, or None
+        return local_db().execute("SELECT MIN(created_at) FROM inventory_journal WHERE flushed_at IS NULL").fetchone()[0]
+
+    def _read_menu(self):
+        values = get_sheet().values_get("'Menu'").get('values', [])
+        header = values[0]
+        name_col, remaining_col = header.index('Item Name'), header.index('Remaining')
+        rows = {}
+        for row_number, row in enumerate(values[1:], start=2):
+            name = row[name_col] if len(row) > name_col else ''
+            if name and name not in rows:
+                rows[name] = (row_number, _remaining_count(row[remaining_col] if len(row) > remaining_col else 0))
+        return rows, remaining_col
+
+    def _flush_quantities(self, db, flush_id):
+        return Counter({row['item']: row['quantity'] for row in db.execute(
+            "SELECT item, SUM(quantity) AS quantity FROM inventory_journal WHERE flush_id = ? GROUP BY item", (flush_id,)
+        )})
+
+    def _release_flush(self, flush_id):
+        # Never applied to Menu: its reservations go out again with the next flush
+        with local_transaction() as db:
+            db.execute("UPDATE inventory_journal SET flush_id = NULL WHERE flush_id = ?", (flush_id,))
+            db.execute("DELETE FROM inventory_flushes WHERE id = ?", (flush_id,))
+
+    def _commit_flush(self, flush_id, remaining):
+        now = time.time()
+        with local_transaction() as db:
+            quantities = self._flush_quantities(db, flush_id)
+            db.execute("UPDATE inventory_journal SET flushed_at = ? WHERE flush_id = ?", (now, flush_id))
+            db.execute("UPDATE inventory_flushes SET committed_at = ? WHERE id = ?", (now, flush_id))
+        oversold = Counter({
+            name: qty - max(remaining[name][0], 0)
+            for name, qty in quantities.items() if name in remaining and qty > max(remaining[name][0], 0)
+        })
+        with self._lock:
+            self._unflushed.subtract(quantities)
+            if self._sheet_counts is not None:
+                self._sheet_counts.update({name: after for name, (_, after) in remaining.items()})
+            self.generation += 1
+            self.oversold.update(oversold)
+        for name, qty in oversold.items():
+            print(f"Inventory Oversold: {name} had {remaining[name][0]} left on Menu for {quantities[name]} reserved here; {qty} oversold")
+        for name in set(quantities) - set(remaining):
+            print(f"Inventory Flush: {name} not found on Menu, dropping {quantities[name]} reserved")
+        sheet_cache.invalidate("Menu")
+        return sum(quantities.values())
+
+    def _recover_flushes(self):
+        for flush in local_db().execute("SELECT id, remaining FROM inventory_flushes WHERE committed_at IS NULL ORDER BY id").fetchall():
+            if flush['remaining'] is None:
+                self._release_flush(flush['id'])
+                continue
+            remaining = json.loads(flush['remaining'])
+            changed = {name: before for name, (before, after) in remaining.items() if before != after}
+            rows, _ = self._read_menu()
+            # The batch update is all or nothing: it didn't land only if every count is untouched
+            landed = not changed or any(name not in rows or rows[name][1] != before for name, before in changed.items())
+            if landed:
+                self._commit_flush(flush['id'], remaining)
+            else:
+                self._release_flush(flush['id'])
+            print(f"Recovered inventory flush {flush['id']}: {'already written' if landed else 'to write again'}")
+
+    def flush(self, timeout=None):
+        # Returns the net quantity written back to Menu; 0 if another flush held the lock past timeout
+        import gspread
+        from gspread.utils import rowcol_to_a1
+        if not self._flush_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return 0
+        try:
+            # Loaded before anything is marked flushed, so a late load can't subtract it twice
+            with self._lock:
+                self._load_unflushed()
+            self._recover_flushes()
+            with local_transaction() as db:
+                if not db.execute("SELECT 1 FROM inventory_journal WHERE flushed_at IS NULL AND flush_id IS NULL LIMIT 1").fetchone():
+                    return 0
+                flush_id = db.execute("INSERT INTO inventory_flushes (started_at) VALUES (?)", (time.time(),)).lastrowid
+                db.execute("UPDATE inventory_journal SET flush_id = ? WHERE flushed_at IS NULL AND flush_id IS NULL", (flush_id,))
+                quantities = self._flush_quantities(db, flush_id)
+
+            try:
+                rows, remaining_col = self._read_menu()
+            except Exception:
+                self._release_flush(flush_id)
+                raise
+            remaining, updates = {}, []
+            for name, qty in quantities.items():
+                if name in rows:
+                    row_number, current = rows[name]
+                    remaining[name] = (current, max(current - qty, 0))
+                    if qty:
+                        updates.append({'range': rowcol_to_a1(row_number, remaining_col + 1), 'values': [[remaining[name][1]]]})
+            with local_transaction() as db:
+                db.execute("UPDATE inventory_flushes SET remaining = ? WHERE id = ?", (json.dumps(remaining), flush_id))
+
+            if updates:
+                try:
+                    get_worksheet("Menu").batch_update(updates)
+                except gspread.exceptions.APIError as e:
+                    # As with Orders: a 4xx wrote nothing, a 5xx may have; recovery checks Menu
+                    if e.response.status_code < 500:
+                        self._release_flush(flush_id)
+                    raise
+            return self._commit_flush(flush_id, remaining)
+        finally:
+            self._flush_lock.release()
+
+    def stats(self):
+        with self._lock:
+            self._load_unflushed()
+            return {
+                'reservations': self.reservations,
+                'rejections': self.rejections,
+                'oversold': dict(self.oversold),
+                'pending': {name: qty for name, qty in self._unflushed.items() if qty},
+                'available': {name: self._available(name) for name in self._sheet_counts or {}}
+            }
+
+inventory = InventoryLedger()
+
+@app.before_request
+def flush_leftover_stock():
+    # Writes back reservations the frozen flusher left for longer than INVENTORY_FLUSH_SECONDS
+    try:
+        writes = inventory.writes.count
+        if writes == inventory.writes.settled:
+            return
+        since = inventory.unflushed_since()
+        if since is None:
+            inventory.writes.settled = writes
+        elif since < time.time() - INVENTORY_FLUSH_SECONDS:
+            inventory.flush(timeout=0)
+    except Exception as e:
+        print(f"Inventory Flush Error: {e}")
+
+# --- WORKSHEET INDEXES ---
+# Keyed lookups over a worksheet. The sheet is read once, then only the rows
+# past the last one we've seen are fetched (at most every catch_up_seconds).
+# The tail read starts at that last row so a deleted or re-sorted sheet is
+# noticed and triggers a full reload; edits to older rows are picked up by the
+# periodic full reload. A live_column that is edited in place (Orders' Payment)
+# is re-read in the same batchGet as the tail on every catch-up. Only the first
+# cursor_columns of the cursor row are compared, so marking that row Paid or
+# Unsubscribed doesn't look like a re-sort.
+INDEX_RELOAD_SECONDS = float(os.environ.get('INDEX_RELOAD_SECONDS', '1800'))
+SUBSCRIBER_INDEX_CATCH_UP = float(os.environ.get('SUBSCRIBER_INDEX_CATCH_UP', '60'))
+VIP_INDEX_CATCH_UP = float(os.environ.get('VIP_INDEX_CATCH_UP', '120'))
+ORDER_INDEX_CATCH_UP = float(os.environ.get('ORDER_INDEX_CATCH_UP', '30'))
+ORDER_STATUS_LIMIT = 5
+# Orders' Timestamp, Name, Contact and Order are never edited after the append
+ORDER_CURSOR_COLUMNS = 4
+ORDER_LOOKUPS_PER_MINUTE = float(os.environ.get('ORDER_LOOKUPS_PER_MINUTE', '6'))
+ORDER_LOOKUP_BURST = 3
+
+def _quote_worksheet(name):
+    return "'" + name.replace("'", "''") + "'"
+
+def appended_row(response):
+    # append_row(s) reports e.g. "'Subscribers'!A57:C57"; return the last row number
+    from gspread.utils import a1_to_rowcol
+    updated_range = response.get('updates', {}).get('updatedRange', '')
+    return a1_to_rowcol(updated_range.split('!')[-1].split(':')[-1])[0] if updated_range else None
+
+class WorksheetIndex:
+    def __init__(self, worksheet_name, entry_for_row, catch_up_seconds, reload_seconds=INDEX_RELOAD_SECONDS, many=False, live_column=None, cursor_columns=None):
+        self.worksheet_name = worksheet_name
+        self.entry_for_row = entry_for_row
+        self.catch_up_seconds = catch_up_seconds
+        self.reload_seconds = reload_seconds
+        # With many=True a key maps to {row number: entry} for every row carrying it
+        self.many = many
+        # 1-based, as in update_cell; the indexed rows are kept to rebuild their entries
+        self.live_column = live_column
+        self._rows = {}
+        self.cursor_columns = cursor_columns
+        self.lock = threading.RLock()
+        self._key_locks = [threading.Lock() for _ in range(64)]
+        self._entries = {}
+        self._header = []
+        self._last_row = 0
+        self._last_row_values = None
+        self._loaded_at = None
+        self._checked_at = None
+
+    def get(self, key):
+        with self.lock:
+            self._ensure_current()
+            return self._entries.get(key)
+
+    def key_lock(self, key):
+        # Serialises check-then-write for one key without blocking other keys
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def put(self, key, entry):
+        # The row itself is re-read on the next catch-up, so only the entry is recorded here
+        with self.lock:
+            self._entries[key] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def warm(self):
+        with self.lock:
+            self._ensure_current()
+
+    def invalidate(self):
+        with self.lock:
+            self._loaded_at = None
+
+    def _ensure_current(self):
+        now = time.monotonic()
+        if self._loaded_at is None or self._last_row == 0 or now - self._loaded_at > self.reload_seconds:
+            self._reload(now)
+        elif now - self._checked_at > self.catch_up_seconds:
+            self._catch_up(now)
+
+    def _reload(self, now):
+        values = get_sheet().values_get(_quote_worksheet(self.worksheet_name)).get('values', [])
+        self._entries, self._rows = {}, {}
+        self._header = values[0] if values else []
+        self._last_row, self._last_row_values = 0, None
+        self._apply(1, values)
+        self._loaded_at = self._checked_at = now
+
+    def _catch_up(self, now):
+        from gspread.utils import rowcol_to_a1
+        tail_range = f"{_quote_worksheet(self.worksheet_name)}!A{self._last_row}:ZZ"
+        live = None
+        if self.live_column and self._last_row > 1:
+            column = rowcol_to_a1(1, self.live_column)[:-1]
+            live_range = f"{_quote_worksheet(self.worksheet_name)}!{column}2:{column}{self._last_row}"
+            response = get_sheet().values_batch_get([tail_range, live_range])
+            values, live = [vr.get('values', []) for vr in response.get('valueRanges', [])]
+        else:
+            values = get_sheet().values_get(tail_range).get('values', [])
+        if not values or values[0][:self.cursor_columns] != self._last_row_values[:self.cursor_columns]:
+            self._reload(now)
+            return
+        if live is not None:
+            self._apply_live(live)
+        self._apply(self._last_row + 1, values[1:])
+        self._checked_at = now
+
+    def _apply_live(self, column_values):
+        # column_values[0] is row 2; the API leaves trailing blank cells out
+        index = self.live_column - 1
+        for row_number, values in list(self._rows.items()):
+            cell = column_values[row_number - 2] if row_number - 2 < len(column_values) else []
+            value = cell[0] if cell else ''
+            current = values[index] if index < len(values) else ''
+            if value != current:
+                values = values + [''] * (index + 1 - len(values))
+                values[index] = value
+                self._store(row_number, values)
+
+    def _apply(self, first_row, rows):
+        for offset, values in enumerate(rows):
+            if first_row + offset > 1:
+                self._store(first_row + offset, values)
+        if rows:
+            self._last_row = first_row + len(rows) - 1
+            self._last_row_values = rows[-1]
+
+    def _store(self, row_number, values):
+        item = self.entry_for_row(row_number, values, self._header)
+        if not item:
+            return
+        key, entry = item
+        if self.many:
+            self._entries.setdefault(key, {})[row_number] = entry
+        else:
+            self._entries[key] = entry
+        if self.live_column:
+            self._rows[row_number] = values
+
+def _subscriber_entry(row_number, values, header):
+    # Subscribers columns: Timestamp, Email, Status
+    email = str(values[1]).strip().lower() if len(values) > 1 else ''
+    if not email:
+        return None
+    return email, {'row': row_number, 'status': values[2] if len(values) > 2 else ''}
+
+subscriber_index = WorksheetIndex("Subscribers", _subscriber_entry, SUBSCRIBER_INDEX_CATCH_UP, cursor_columns=2)
+
+def add_subscriber(email, timestamp):
+    with subscriber_index.key_lock(email):
+        if subscriber_index.get(email) is not None:
+            return False
+        response = get_worksheet("Subscribers").append_row([
+            timestamp.strftime("%m/%d/%Y %H:%M:%S"),
+            email,
+            'Active'
+        ], value_input_option='USER_ENTERED')
+        # row is None if Sheets didn't report the range; unsubscribe_subscriber then reloads
+        subscriber_index.put(email, {'row': appended_row(response), 'status': 'Active'})
+        return True
+
+def unsubscribe_subscriber(email):
+    with subscriber_index.key_lock(email):
+        for attempt in range(2):
+            entry = subscriber_index.get(email)
+            if entry is None or entry['status'] == 'Unsubscribed':
+                return False
+            # The row number may be stale: check it still holds this email before writing to it
+            if entry['row'] is not None:
+                cell = get_sheet().values_get(f"'Subscribers'!B{entry['row']}").get('values', [])
+                if cell and cell[0] and str(cell[0][0]).strip().lower() == email:
+                    get_worksheet("Subscribers").update_cell(entry['row'], 3, 'Unsubscribed')
+                    subscriber_index.put(email, dict(entry, status='Unsubscribed'))
+                    return True
+            # Rows were deleted or re-sorted, or the append didn't report its row
+            subscriber_index.invalidate()
+        print(f"Unsubscribe Error: {email} isn't where the Subscribers index says")
+        return False
+
+def _vip_entry(row_number, values, header):
+    record = dict(zip(header, values))
+    email = str(record.get('Email', '')).strip().lower()
+    if not email:
+        return None
+    return email, {'row': row_number, 'size': record.get('Size') or 'Size Unknown', 'status': record.get('Status', '')}
+
+vip_index = WorksheetIndex("Bread Subscriptions", _vip_entry, VIP_INDEX_CATCH_UP)
+
+def _order_entry(row_number, values, header):
+    # Orders columns: Timestamp, Name, Contact, Order, Logistics, Details, Subscription, Notes, Total, Payment
+    contact = str(values[2]).strip().lower() if len(values) > 2 else ''
+    if not contact:
+        return None
+    return contact, _order_status(values)
+
+def _order_status(values):
+    # Only what the customer needs to see; names and notes stay out of the lookup
+    values = values + [''] * (10 - len(values))
+    return {
+        'placed': values[0],
+        'summary': values[3],
+        'logistics': values[4],
+        'pickup_window': values[5],
+        'payment': values[9] or 'Pending'
+    }
+
+# Payment (column J) is marked by hand after the order lands, so it's re-read on catch-up
+order_index = WorksheetIndex("Orders", _order_entry, ORDER_INDEX_CATCH_UP, many=True, live_column=10, cursor_columns=ORDER_CURSOR_COLUMNS)
+
+_order_lookup_buckets = {}
+_order_lookup_buckets_lock = threading.Lock()
+
+def allow_order_lookup(key):
+    # Keyed by IP and by email: each lookup sends mail, so neither gets more than a handful a minute
+    with _order_lookup_buckets_lock:
+        if len(_order_lookup_buckets) > 10000:
+            _order_lookup_buckets.clear()
+        bucket = _order_lookup_buckets.get(key)
+        if bucket is None:
+            bucket = _order_lookup_buckets[key] = TokenBucket(ORDER_LOOKUPS_PER_MINUTE / 60, ORDER_LOOKUP_BURST)
+    return bucket.try_acquire()
+
+def _order_status_key(order):
+    # USER_ENTERED reformats the timestamp, so compare it parsed
+    return (_order_timestamp(order['placed']) or str(order['placed']).strip(), str(order['summary']).strip())
+
+def lookup_orders(contact, limit=ORDER_STATUS_LIMIT):
+    # Newest first, without a Sheets read of its own. Orders still in this
+    # instance's journal (or flushed after the index last caught up) come from
+    # there; everything else from the index.
+    contact = contact.strip().lower()
+    recent_since = time.time() - ORDER_INDEX_CATCH_UP * 2
+    journal = local_db().execute(
+        "SELECT row FROM order_journal WHERE flushed_at IS NULL OR flushed_at > ? ORDER BY created_at DESC",
+        (recent_since,)
+    ).fetchall()
+    orders = [_order_status(row) for row in (json.loads(r['row']) for r in journal) if str(row[2]).strip().lower() == contact]
+
+    entries = order_index.get(contact) or {}
+    sheet_orders = [entries[row] for row in sorted(entries, reverse=True)[:limit]]
+
+    # A journaled order that has since landed in the sheet is shown once. The
+    # placed time keeps a repeat of an earlier order from being taken for it.
+    landed = Counter(_order_status_key(o) for o in sheet_orders)
+    unflushed = []
+    for order in orders:
+        key = _order_status_key(order)
+        if landed[key] > 0:
+            landed[key] -= 1
+        else:
+            unflushed.append(order)
+    return (unflushed + sheet_orders)[:limit]
+
+def is_admin_request():
+    token = os.environ.get('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token') or request.args.get('token') or ''
+    authorization = request.headers.get('Authorization', '')
+    if not supplied and authorization.startswith('Bearer '):
+        supplied = authorization[len('Bearer '):]
+    return bool(token) and hmac.compare_digest(supplied, token)
 
 def get_bake_settings():
     try:
-        sheet = get_sheet()
-        settings_sheet = sheet.worksheet("Settings")
-        data = settings_sheet.get_all_records()
-        
-        settings_dict = {}
-        for item in data:
-            if item.get('Setting Name'):
-                settings_dict[item['Setting Name']] = item['Value']
+        settings_dict = get_settings()
         
         bake_date_str = settings_dict.get('Next Bake Date', '01/01/2099')
         bake_date_dt = None
@@ -52,6 +1228,1012 @@ def get_bake_settings():
         future = datetime.now(ZoneInfo('America/New_York')) + timedelta(days=1)
         return future, future, "the night before bake day"
 
+# --- EMAIL OUTBOX ---
+# Emails are written to email_outbox and the request that wrote one sends it
+# straight away, waiting at most OUTBOX_SEND_TIMEOUT: Vercel freezes the
+# process once the response is out and /tmp goes with the instance, so mail
+# left for later may never go. The row is kept for retries, which worker
+# threads drain over one kept-alive Brevo connection each, with exponential
+# backoff. Since the workers are frozen too, a request that finds mail due for
+# more than OUTBOX_STALE_SECONDS, while nothing has been sent for that long,
+# sends up to OUTBOX_REQUEST_DRAIN messages itself before doing its own work.
+# Mail still unsent after OUTBOX_OVERDUE_SECONDS is counted in /metrics.
+BREVO_API_URL = os.environ.get('BREVO_API_URL', 'https://api.brevo.com/v3/smtp/email')
+BREVO_SENDER = {"name": "Aiara Bakery", "email": "greg@aiarabakery.com"}
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', '2'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '6'))
+OUTBOX_BACKOFF_SECONDS = float(os.environ.get('OUTBOX_BACKOFF_SECONDS', '5'))
+OUTBOX_LEASE_SECONDS = 120
+OUTBOX_STALE_SECONDS = float(os.environ.get('OUTBOX_STALE_SECONDS', '10'))
+OUTBOX_REQUEST_DRAIN = int(os.environ.get('OUTBOX_REQUEST_DRAIN', '5'))
+OUTBOX_SEND_TIMEOUT = float(os.environ.get('OUTBOX_SEND_TIMEOUT', '3'))
+OUTBOX_OVERDUE_SECONDS = float(os.environ.get('OUTBOX_OVERDUE_SECONDS', '600'))
+
+class BrevoError(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"Brevo responded {status}: {body[:200]}")
+        self.status = status
+        # 429 and 5xx are worth another try; any other 4xx will fail the same way again
+        self.retryable = status == 429 or status >= 500
+
+class BrevoConnection:
+    def __init__(self, url=None, timeout=15):
+        parts = urlsplit(url or BREVO_API_URL)
+        self.timeout = timeout
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or '/'
+        self.conn = None
+        self.reused = False
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+
+    def post(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {
+            'api-key': os.environ.get('BREVO_API_KEY', ''),
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+        while True:
+            if self.conn is None:
+                connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+                self.conn = connection_class(self.host, self.port, timeout=self.timeout)
+                self.reused = False
+            started = time.perf_counter()
+            try:
+                self.conn.request('POST', self.path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response_body = response.read().decode('utf-8', 'replace')
+                record_external('brevo', time.perf_counter() - started, None if response.status < 300 else str(response.status))
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                record_external('brevo', time.perf_counter() - started, type(e).__name__)
+                # An idle keep-alive socket closed by Brevo; reconnect once
+                was_reused = self.reused
+                self.close()
+                if was_reused:
+                    continue
+                raise
+            except Exception as e:
+                record_external('brevo', time.perf_counter() - started, type(e).__name__)
+                self.close()
+                raise
+            self.reused = True
+            if response.will_close:
+                self.close()
+            if response.status >= 300:
+                raise BrevoError(response.status, response_body)
+            return json.loads(response_body) if response_body else {}
+
+def brevo_message(subject, recipient, html_content):
+    return {
+        "sender": BREVO_SENDER,
+        "to": [{"email": recipient}],
+        "subject": subject,
+        "htmlContent": html_content
+    }
+
+_outbox_wakeup = threading.Event()
+_outbox_lock = threading.Lock()
+_outbox_threads = []
+_outbox_request_drain_lock = threading.Lock()
+_outbox_last_claim = 0.0
+# Each request thread keeps its own connection alive for the mail it sends
+_request_brevo = threading.local()
+outbox_writes = WriteCounter()
+
+def enqueue_email(payload, label):
+    try:
+        now = time.time()
+        with local_transaction() as db:
+            # Claimed by this request from the start, so no worker sends it too
+            message_id = db.execute(
+                "INSERT INTO email_outbox (created_at, label, payload, status, attempts, next_attempt_at, claimed_at) "
+                "VALUES (?, ?, ?, 'sending', 1, ?, ?)",
+                (now, label, json.dumps(payload), now, now)
+            ).lastrowid
+    except sqlite3.Error as e:
+        # Without the local store, send it without a retry rather than dropping it
+        print(f"Outbox Error ({label}): {e}")
+        BrevoConnection().post(payload)
+        return
+    outbox_writes.wrote()
+    brevo = getattr(_request_brevo, 'conn', None)
+    if brevo is None:
+        brevo = _request_brevo.conn = BrevoConnection(timeout=OUTBOX_SEND_TIMEOUT)
+    row = {'id': message_id, 'label': label, 'payload': json.dumps(payload), 'attempts': 0}
+    if not _deliver_outbox_message(brevo, row):
+        # Left pending with a backoff; the workers, or a later request, retry it
+        start_outbox_workers()
+
+def start_outbox_workers():
+    with _outbox_lock:
+        _outbox_threads[:] = [t for t in _outbox_threads if t.is_alive()]
+        while len(_outbox_threads) < OUTBOX_WORKERS:
+            thread = threading.Thread(target=_outbox_worker, daemon=True)
+            thread.start()
+            _outbox_threads.append(thread)
+
+def _claim_outbox_message():
+    now = time.time()
+    with local_transaction() as db:
+        row = db.execute(
+            "SELECT id, label, payload, attempts FROM email_outbox "
+            "WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND claimed_at < ?) "
+            "ORDER BY id LIMIT 1",
+            (now, now - OUTBOX_LEASE_SECONDS)
+        ).fetchone()
+        if row is not None:
+            db.execute(
+                "UPDATE email_outbox SET status = 'sending', claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (now, row['id'])
+            )
+    return row
+
+def _deliver_outbox_message(brevo, row):
+    attempts = row['attempts'] + 1
+    try:
+        result = brevo.post(json.loads(row['payload']))
+    except Exception as e:
+        retryable = getattr(e, 'retryable', True)
+        if retryable and attempts < OUTBOX_MAX_ATTEMPTS:
+            delay = OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+            status, next_attempt_at = 'pending', time.time() + delay
+        else:
+            status, next_attempt_at = 'failed', None
+        print(f"Brevo API Error ({row['label']}, attempt {attempts}, {status}): {e}")
+        with local_transaction() as db:
+            db.execute(
+                "UPDATE email_outbox SET status = ?, next_attempt_at = COALESCE(?, next_attempt_at), last_error = ? WHERE id = ?",
+                (status, next_attempt_at, str(e), row['id'])
+            )
+        return False
+
+    message_id = result.get('messageId') or ','.join(result.get('messageIds', []))
+    print(f"Email sent ({row['label']}): {message_id}")
+    with local_transaction() as db:
+        db.execute(
+            "UPDATE email_outbox SET status = 'sent', sent_at = ?, message_id = ?, last_error = NULL WHERE id = ?",
+            (time.time(), message_id, row['id'])
+        )
+    return True
+
+def drain_outbox(brevo=None, limit=None):
+    global _outbox_last_claim
+    brevo = brevo or BrevoConnection()
+    delivered = 0
+    while limit is None or delivered < limit:
+        row = _claim_outbox_message()
+        if row is None:
+            return delivered
+        _outbox_last_claim = time.time()
+        _deliver_outbox_message(brevo, row)
+        delivered += 1
+    return delivered
+
+def _outbox_worker():
+    brevo = BrevoConnection()
+    while True:
+        try:
+            drain_outbox(brevo)
+        except Exception as e:
+            print(f"Outbox Worker Error: {e}")
+        # Woken by new mail; the timeout picks up retries whose backoff has elapsed
+        _outbox_wakeup.wait(timeout=OUTBOX_BACKOFF_SECONDS)
+        _outbox_wakeup.clear()
+
+def outbox_backlog():
+    # (unsent, stale): everything still to send, and what's been waiting too long
+    now = time.time()
+    unsent, stale = local_db().execute(
+        "SELECT COUNT(*), SUM((status = 'pending' AND next_attempt_at < ?) OR (status = 'sending' AND claimed_at < ?)) "
+        "FROM email_outbox WHERE status IN ('pending', 'sending')",
+        (now - OUTBOX_STALE_SECONDS, now - OUTBOX_LEASE_SECONDS)
+    ).fetchone()
+    return unsent, stale or 0
+
+@app.before_request
+def drain_stale_outbox():
+    # Fresh mail is left to the workers; one request at a time picks up after them
+    try:
+        writes = outbox_writes.count
+        if writes == outbox_writes.settled or time.time() - _outbox_last_claim < OUTBOX_STALE_SECONDS:
+            return
+        unsent, stale = outbox_backlog()
+        if not unsent:
+            outbox_writes.settled = writes
+        if not stale:
+            return
+        if not _outbox_request_drain_lock.acquire(blocking=False):
+            return
+        try:
+            drain_outbox(limit=OUTBOX_REQUEST_DRAIN)
+        finally:
+            _outbox_request_drain_lock.release()
+        start_outbox_workers()
+        _outbox_wakeup.set()
+    except Exception as e:
+        print(f"Outbox Drain Error: {e}")
+
+def outbox_stats():
+    db = local_db()
+    counts = {row['status']: row['n'] for row in db.execute("SELECT status, COUNT(*) AS n FROM email_outbox GROUP BY status")}
+    failures = [dict(row) for row in db.execute(
+        "SELECT id, label, attempts, last_error, created_at FROM email_outbox WHERE status = 'failed' ORDER BY id DESC LIMIT 20"
+    )]
+    overdue = db.execute(
+        "SELECT COUNT(*) FROM email_outbox WHERE status IN ('pending', 'sending') AND created_at < ?",
+        (time.time() - OUTBOX_OVERDUE_SECONDS,)
+    ).fetchone()[0]
+    return {'counts': counts, 'overdue': overdue, 'recent_failures': failures}
+
+# --- ORDER JOURNAL ---
+# /submit and /vip-submit commit each order to order_journal and then flush the
+# journal to "Orders" before answering, so concurrent orders share one
+# append_rows call. If the order can't be handed to Sheets within
+# ORDER_FLUSH_DEADLINE it's taken back out of the journal and the customer sees
+# an error, as they would have with a direct append. Each batch is recorded in
+# order_flushes before the append; a batch whose outcome is unknown (5xx,
+# timeout, crash) is checked against the rows that actually landed before
+# anything is re-sent, so replays don't duplicate orders. Those leftovers are
+# retried by the next request on the instance and by a background flusher.
+ORDER_FLUSH_BATCH = int(os.environ.get('ORDER_FLUSH_BATCH', '50'))
+ORDER_FLUSH_DEADLINE = float(os.environ.get('ORDER_FLUSH_DEADLINE', '8'))
+ORDER_FLUSH_RETRY_SECONDS = float(os.environ.get('ORDER_FLUSH_RETRY_SECONDS', '5'))
+
+class OrderNotSaved(Exception):
+    pass
+
+_order_flush_lock = threading.Lock()
+_order_flush_wakeup = threading.Event()
+_order_flusher_lock = threading.Lock()
+_order_flusher = None
+order_journal_writes = WriteCounter()
+
+def record_order(row):
+    try:
+        with local_transaction() as db:
+            entry_id = db.execute(
+                "INSERT INTO order_journal (created_at, row) VALUES (?, ?)", (time.time(), json.dumps(row))
+            ).lastrowid
+    except sqlite3.Error as e:
+        print(f"Order Journal Error: {e}")
+        get_worksheet("Orders").append_row(row, value_input_option='USER_ENTERED')
+        return
+    order_journal_writes.wrote()
+
+    try:
+        flush_orders(timeout=ORDER_FLUSH_DEADLINE, until=entry_id)
+    except Exception as e:
+        print(f"Order Flush Error: {e}")
+    with local_transaction() as db:
+        entry = db.execute("SELECT flush_id, flushed_at FROM order_journal WHERE id = ?", (entry_id,)).fetchone()
+        withdrawn = entry['flushed_at'] is None and entry['flush_id'] is None
+        if withdrawn:
+            # Never sent, so withdrawing it is safe and the customer can simply retry
+            db.execute("DELETE FROM order_journal WHERE id = ?", (entry_id,))
+    if withdrawn:
+        raise OrderNotSaved("We couldn't save your order just now. Please try again in a minute.")
+    if entry['flushed_at'] is None:
+        # Its append may or may not have landed; recovery settles it without duplicating
+        start_order_flusher()
+        _order_flush_wakeup.set()
+
+def start_order_flusher():
+    global _order_flusher
+    with _order_flusher_lock:
+        if _order_flusher is None or not _order_flusher.is_alive():
+            _order_flusher = threading.Thread(target=_order_flusher_loop, daemon=True)
+            _order_flusher.start()
+
+def _order_flusher_loop():
+    # Retries only; orders are normally flushed by the request that placed them
+    while True:
+        _order_flush_wakeup.wait(timeout=ORDER_FLUSH_RETRY_SECONDS)
+        _order_flush_wakeup.clear()
+        try:
+            if pending_order_count():
+                flush_orders()
+        except Exception as e:
+            print(f"Order Flush Error: {e}")
+
+def _order_row_key(row):
+    # USER_ENTERED reformats dates and totals, so match on what the sheet keeps verbatim.
+    # The timestamp, normalised, keeps a repeat order of the same items from matching.
+    return (_order_timestamp(row[0]) or str(row[0]).strip(), str(row[2]).strip().lower(), str(row[3]).strip())
+
+def _orders_end_row(db):
+    # The latest flush's, not the highest ever reached: Orders gets trimmed by hand
+    flush = db.execute("SELECT end_row FROM order_flushes WHERE end_row IS NOT NULL ORDER BY id DESC LIMIT 1").fetchone()
+    if flush is None:
+        return len(get_sheet().values_get("'Orders'!A:A").get('values', []))
+    return flush['end_row']
+
+def _recover_order_flushes():
+    for flush in local_db().execute("SELECT id, start_row FROM order_flushes WHERE committed_at IS NULL ORDER BY id").fetchall():
+        batch_size = local_db().execute("SELECT COUNT(*) FROM order_journal WHERE flush_id = ?", (flush['id'],)).fetchone()[0]
+        first_row = flush['start_row'] + 1
+        written = get_sheet().values_get(f"'Orders'!A{first_row}:J").get('values', [])
+        if len(written) < batch_size:
+            # Either the batch never landed or Orders was trimmed since start_row was
+            # taken, and it landed above start_row; only the whole sheet can tell
+            first_row = 2
+            written = get_sheet().values_get(f"'Orders'!A{first_row}:J").get('values', [])
+        landed = Counter(_order_row_key(r) for r in written if len(r) > 3)
+        now = time.time()
+        with local_transaction() as db:
+            entries = db.execute("SELECT id, row FROM order_journal WHERE flush_id = ? AND flushed_at IS NULL", (flush['id'],)).fetchall()
+            replayed = 0
+            for entry in entries:
+                key = _order_row_key(json.loads(entry['row']))
+                if landed[key] > 0:
+                    landed[key] -= 1
+                    db.execute("UPDATE order_journal SET flushed_at = ? WHERE id = ?", (now, entry['id']))
+                else:
+                    db.execute("UPDATE order_journal SET flush_id = NULL WHERE id = ?", (entry['id'],))
+                    replayed += 1
+            db.execute(
+                "UPDATE order_flushes SET committed_at = ?, end_row = ? WHERE id = ?",
+                (now, first_row - 1 + len(written), flush['id'])
+            )
+        print(f"Recovered order flush {flush['id']}: {len(entries) - replayed} already written, {replayed} to replay")
+
+def flush_orders(timeout=None, until=None):
+    # Returns the number of orders appended; 0 if another flush held the lock past timeout.
+    # With until, stops once that journal entry and everything before it has been sent:
+    # an order's own request doesn't wait on the ones that arrived after it.
+    import gspread
+    flushed = 0
+    if not _order_flush_lock.acquire(timeout=-1 if timeout is None else timeout):
+        return flushed
+    try:
+        _recover_order_flushes()
+        while True:
+            start_row = _orders_end_row(local_db())
+            with local_transaction() as db:
+                if until is not None and not db.execute(
+                    "SELECT 1 FROM order_journal WHERE id <= ? AND flushed_at IS NULL AND flush_id IS NULL LIMIT 1", (until,)
+                ).fetchone():
+                    return flushed
+                entries = db.execute(
+                    "SELECT id, row FROM order_journal WHERE flushed_at IS NULL AND flush_id IS NULL "
+                    "ORDER BY created_at, id LIMIT ?",
+                    (ORDER_FLUSH_BATCH,)
+                ).fetchall()
+                if not entries:
+                    return flushed
+                flush_id = db.execute(
+                    "INSERT INTO order_flushes (started_at, start_row) VALUES (?, ?)", (time.time(), start_row)
+                ).lastrowid
+                db.executemany("UPDATE order_journal SET flush_id = ? WHERE id = ?", [(flush_id, e['id']) for e in entries])
+
+            try:
+                response = get_worksheet("Orders").append_rows(
+                    [json.loads(e['row']) for e in entries], value_input_option='USER_ENTERED'
+                )
+            except gspread.exceptions.APIError as e:
+                # A 4xx (429 included) means Sheets rejected the request and wrote nothing, so
+                # the batch can be released. A 5xx may have written it; leave that for recovery.
+                if e.response.status_code < 500:
+                    with local_transaction() as db:
+                        db.execute("UPDATE order_journal SET flush_id = NULL WHERE flush_id = ?", (flush_id,))
+                        db.execute("DELETE FROM order_flushes WHERE id = ?", (flush_id,))
+                raise
+            # Anything else (timeouts, dropped connections) also leaves the flush open for recovery
+
+            end_row = appended_row(response) or start_row + len(entries)
+            now = time.time()
+            with local_transaction() as db:
+                db.execute("UPDATE order_journal SET flushed_at = ? WHERE flush_id = ?", (now, flush_id))
+                db.execute("UPDATE order_flushes SET committed_at = ?, end_row = ? WHERE id = ?", (now, end_row, flush_id))
+            flushed += len(entries)
+    finally:
+        _order_flush_lock.release()
+
+def pending_order_count(before=None):
+    return local_db().execute(
+        "SELECT COUNT(*) FROM order_journal WHERE flushed_at IS NULL AND created_at < ?", (before or float('inf'),)
+    ).fetchone()[0]
+
+@app.before_request
+def flush_leftover_orders():
+    # Vercel freezes the background flusher between invocations, so each request
+    # finishes whatever earlier ones on this instance couldn't. Orders younger
+    # than the flush deadline are still being flushed by their own requests.
+    try:
+        writes = order_journal_writes.count
+        if writes == order_journal_writes.settled:
+            return
+        if pending_order_count(before=time.time() - ORDER_FLUSH_DEADLINE):
+            flush_orders(timeout=0)
+        elif not pending_order_count():
+            order_journal_writes.settled = writes
+    except Exception as e:
+        print(f"Order Flush Error: {e}")
+
+# --- PAGE CACHE ---
+# Menu pages only change when their inputs (menu, settings, live stock) do, so
+# the rendered HTML is cached under a hash of those inputs together with gzip
+# and brotli variants. The hash doubles as a strong ETag for 304s, and the
+# s-maxage/stale-while-revalidate header lets Vercel's edge absorb drop traffic.
+# Each version is rendered once: requests that miss while it's being rendered
+# wait for that render instead of starting their own.
+PAGE_CACHE_CONTROL = os.environ.get('PAGE_CACHE_CONTROL', 'public, max-age=0, s-maxage=10, stale-while-revalidate=60')
+PAGE_CACHE_SIZE = 32
+# Quality 11 costs tens of milliseconds per render for a few percent over 5
+PAGE_BROTLI_QUALITY = 5
+PAGE_ENCODINGS = ['br', 'gzip', 'identity'] if brotli else ['gzip', 'identity']
+
+_page_cache = OrderedDict()
+_page_cache_lock = threading.Lock()
+_latest_pages = {}
+_page_renders = {}
+page_cache_stats = Counter()
+
+def _page_etag(version, encoding):
+    return version if encoding == 'identity' else f"{version}-{encoding}"
+
+def _compress_page(html):
+    bodies = {'identity': html, 'gzip': gzip.compress(html, 9)}
+    if brotli:
+        bodies['br'] = brotli.compress(html, quality=PAGE_BROTLI_QUALITY)
+    return bodies
+
+def render_cached_page(template, endpoint=None, **context):
+    version = hashlib.sha256(json.dumps([template, context], sort_keys=True, default=str).encode('utf-8')).hexdigest()[:32]
+    while True:
+        with _page_cache_lock:
+            bodies = _page_cache.get(version)
+            if bodies is not None:
+                _page_cache.move_to_end(version)
+                page_cache_stats['hits'] += 1
+                break
+            rendering = _page_renders.get(version)
+            leader = rendering is None
+            if leader:
+                rendering = _page_renders[version] = threading.Event()
+        if not leader:
+            # If that render fails, the next pass renders it here instead
+            page_cache_stats['coalesced'] += 1
+            rendering.wait()
+            continue
+        page_cache_stats['misses'] += 1
+        try:
+            bodies = _compress_page(render_template(template, **context).encode('utf-8'))
+            with _page_cache_lock:
+                _page_cache[version] = bodies
+                while len(_page_cache) > PAGE_CACHE_SIZE:
+                    _page_cache.popitem(last=False)
+        finally:
+            with _page_cache_lock:
+                del _page_renders[version]
+            rendering.set()
+        break
+    with _page_cache_lock:
+        _latest_pages[endpoint or request.endpoint] = version
+    return _page_response(version, bodies, PAGE_CACHE_CONTROL)
+
+def latest_cached_page():
+    # The last page this route rendered, without looking at the sheet cache or stock
+    with _page_cache_lock:
+        version = _latest_pages.get(request.endpoint)
+        bodies = _page_cache.get(version)
+    if bodies is None:
+        return None
+    page_cache_stats['shed'] += 1
+    return _page_response(version, bodies, PAGE_CACHE_CONTROL_SHED)
+
+def _page_response(version, bodies, cache_control):
+    encoding = request.accept_encodings.best_match(PAGE_ENCODINGS, default='identity')
+    if any(request.if_none_match.contains(_page_etag(version, e)) for e in PAGE_ENCODINGS):
+        page_cache_stats['not_modified'] += 1
+        response = make_response('', 304)
+    else:
+        response = make_response(bodies[encoding])
+        response.content_type = 'text/html; charset=utf-8'
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(_page_etag(version, encoding))
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# --- STATIC ASSETS ---
+# The menu pages' CSS and JavaScript live in assets/. `flask build-assets`
+# minifies them into public/assets/<name>.<content hash>.<ext> and records the
+# hashed names in public/assets/manifest.json, which asset_url() resolves in
+# the templates. A changed file gets a new name, so every asset can be served
+# as immutable for a year and repeat visits only download the HTML.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSET_SOURCE_DIR = os.path.join(PROJECT_DIR, 'assets')
+ASSET_OUTPUT_DIR = os.path.join(PROJECT_DIR, 'public', 'assets')
+ASSET_MANIFEST_PATH = os.path.join(ASSET_OUTPUT_DIR, 'manifest.json')
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ASSET_FALLBACK_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+ASSET_TYPES = ('.css', '.js')
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{}:;,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+def minify_js(source):
+    # Indentation, blank lines and comments only; line breaks stay so semicolon insertion is unaffected
+    lines = []
+    for line in source.splitlines():
+        line = re.sub(r'\s+//[^\'"`]*$', '', line).strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+def build_assets(write=True):
+    minifiers = {'.css': minify_css, '.js': minify_js}
+    manifest, outputs = {}, {}
+    for name in sorted(os.listdir(ASSET_SOURCE_DIR)):
+        stem, ext = os.path.splitext(name)
+        if ext not in minifiers:
+            continue
+        with open(os.path.join(ASSET_SOURCE_DIR, name), encoding='utf-8') as f:
+            content = minifiers[ext](f.read()).encode('utf-8')
+        manifest[name] = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+        outputs[manifest[name]] = content
+    if not write:
+        return manifest
+
+    os.makedirs(ASSET_OUTPUT_DIR, exist_ok=True)
+    for filename, content in outputs.items():
+        with open(os.path.join(ASSET_OUTPUT_DIR, filename), 'wb') as f:
+            f.write(content)
+    for filename in os.listdir(ASSET_OUTPUT_DIR):
+        if filename != 'manifest.json' and filename not in outputs:
+            os.remove(os.path.join(ASSET_OUTPUT_DIR, filename))
+    with open(ASSET_MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    asset_manifest.clear()
+    asset_manifest.update(manifest)
+    return manifest
+
+def load_asset_manifest():
+    # A missing, stale or half-deployed manifest mustn't take the menu pages
+    # down: anything it can't vouch for is served unhashed from assets/
+    try:
+        with open(ASSET_MANIFEST_PATH) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Asset Manifest Error: {e}")
+        manifest = {}
+    for name, filename in list(manifest.items()):
+        if not os.path.exists(os.path.join(ASSET_OUTPUT_DIR, filename)):
+            print(f"Asset Manifest Error: {filename} is missing, serving {name} unhashed")
+            del manifest[name]
+    for name in sorted(os.listdir(ASSET_SOURCE_DIR)) if os.path.isdir(ASSET_SOURCE_DIR) else []:
+        if name.endswith(ASSET_TYPES) and name not in manifest:
+            print(f"Asset Manifest Error: {name} isn't built, serving it unhashed; run flask build-assets")
+    return manifest
+
+asset_manifest = load_asset_manifest()
+
+@app.template_global()
+def asset_url(name):
+    return url_for('asset', filename=asset_manifest.get(name, name))
+
+# --- ADMISSION CONTROL ---
+# At most ORDER_ADMISSION_LIMIT order submissions run at once. Anyone past that
+# waits in a FIFO queue: first in-process for ADMISSION_WAIT_SECONDS, then on a
+# waiting-room page that keeps their form, polls /waiting-room/<ticket> for its
+# position and resubmits once admitted. An admitted ticket holds its slot for
+# ADMISSION_CLAIM_SECONDS; a ticket that stops polling for ADMISSION_TICKET_TTL
+# seconds is dropped. While anyone is queued, menu pages are served from the
+# last rendered copy so page views don't add to the load on Sheets. Orders
+# in flight together share one append, so the cap is sized for a menu-drop
+# stampede rather than an ordinary burst.
+ORDER_ADMISSION_LIMIT = int(os.environ.get('ORDER_ADMISSION_LIMIT', '32'))
+ADMISSION_WAIT_SECONDS = float(os.environ.get('ADMISSION_WAIT_SECONDS', '5'))
+ADMISSION_POLL_SECONDS = float(os.environ.get('ADMISSION_POLL_SECONDS', '3'))
+ADMISSION_CLAIM_SECONDS = float(os.environ.get('ADMISSION_CLAIM_SECONDS', '20'))
+ADMISSION_TICKET_TTL = float(os.environ.get('ADMISSION_TICKET_TTL', '30'))
+PAGE_CACHE_CONTROL_SHED = os.environ.get('PAGE_CACHE_CONTROL_SHED', 'public, max-age=0, s-maxage=30, stale-while-revalidate=120')
+
+class WaitingRoom:
+    def __init__(self, capacity, claim_seconds, ticket_ttl):
+        self.capacity = capacity
+        self.claim_seconds = claim_seconds
+        self.ticket_ttl = ticket_ttl
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = OrderedDict()
+        self._admitted = {}
+        self.counts = Counter()
+
+    def busy(self):
+        return bool(self._waiting or self._admitted)
+
+    def enter(self, ticket=None, wait_seconds=0):
+        # Returns (admitted, ticket); a ticket that isn't admitted stays queued
+        with self._cond:
+            now = time.monotonic()
+            self._expire(now)
+            if ticket in self._admitted:
+                return self._claim(ticket), None
+            if ticket not in self._waiting:
+                if not self._waiting and self._active + len(self._admitted) < self.capacity:
+                    self._active += 1
+                    self.counts['admitted'] += 1
+                    return True, None
+                ticket = secrets.token_urlsafe(16)
+                self._waiting[ticket] = now
+                self.counts['queued'] += 1
+            deadline = now + wait_seconds
+            while ticket in self._waiting and now < deadline:
+                self._waiting[ticket] = now
+                self._cond.wait(min(deadline - now, 1))
+                now = time.monotonic()
+                self._expire(now)
+            if ticket in self._admitted:
+                return self._claim(ticket), None
+            return False, ticket
+
+    def leave(self):
+        with self._cond:
+            self._active -= 1
+            self._promote(time.monotonic())
+
+    def status(self, ticket):
+        with self._cond:
+            now = time.monotonic()
+            self._expire(now)
+            if ticket in self._admitted:
+                return {'admitted': True, 'position': 0}
+            if ticket not in self._waiting:
+                return None
+            self._waiting[ticket] = now
+            return {'admitted': False, 'position': list(self._waiting).index(ticket) + 1}
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counts, active=self._active, waiting=len(self._waiting),
+                        held=len(self._admitted), capacity=self.capacity)
+
+    def _claim(self, ticket):
+        del self._admitted[ticket]
+        self._active += 1
+        self.counts['admitted'] += 1
+        return True
+
+    def _expire(self, now):
+        for ticket, seen in list(self._waiting.items()):
+            if now - seen > self.ticket_ttl:
+                del self._waiting[ticket]
+                self.counts['abandoned'] += 1
+        for ticket, admitted_at in list(self._admitted.items()):
+            if now - admitted_at > self.claim_seconds:
+                del self._admitted[ticket]
+                self.counts['unclaimed'] += 1
+        self._promote(now)
+
+    def _promote(self, now):
+        promoted = False
+        while self._waiting and self._active + len(self._admitted) < self.capacity:
+            ticket, _ = self._waiting.popitem(last=False)
+            self._admitted[ticket] = now
+            promoted = True
+        if promoted:
+            self._cond.notify_all()
+
+order_admission = WaitingRoom(ORDER_ADMISSION_LIMIT, ADMISSION_CLAIM_SECONDS, ADMISSION_TICKET_TTL)
+
+def waiting_room_page(ticket):
+    status = order_admission.status(ticket) or {'position': '?'}
+    fields = ''.join(
+        f'<input type="hidden" name="{escape(key)}" value="{escape(value)}">'
+        for key, values in request.form.lists() if key != 'ticket' for value in values
+    )
+    return f"""
+        <div style="padding: 50px; font-family: sans-serif; text-align: center;">
+            <h2 style="color: #5d4037;">You're in line 🍞</h2>
+            <p>Lots of people are ordering right now. Your order is saved on this page and goes through automatically when it's your turn.</p>
+            <p>Position in line: <strong id="position">{status['position']}</strong></p>
+            <form id="waiting-form" method="post" action="{escape(request.path)}">
+                {fields}
+                <input type="hidden" name="ticket" value="{escape(ticket)}">
+                <noscript><button type="submit">Try again</button></noscript>
+            </form>
+        </div>
+        <script>
+            (function poll() {{
+                fetch("{url_for('waiting_room_status', ticket=ticket)}").then(function (r) {{ return r.json(); }}).then(function (s) {{
+                    if (s.admitted || s.expired) {{ document.getElementById('waiting-form').submit(); return; }}
+                    document.getElementById('position').textContent = s.position;
+                    setTimeout(poll, s.retry_after * 1000);
+                }}).catch(function () {{ setTimeout(poll, {ADMISSION_POLL_SECONDS * 1000:.0f}); }});
+            }})();
+        </script>
+    """, 202, {'Retry-After': f"{ADMISSION_POLL_SECONDS:.0f}", 'Cache-Control': 'no-store'}
+
+def admission_controlled(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        admitted, ticket = order_admission.enter(request.form.get('ticket'), ADMISSION_WAIT_SECONDS)
+        if not admitted:
+            return waiting_room_page(ticket)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            order_admission.leave()
+    return wrapper
+
+def shed_page_load():
+    return latest_cached_page() if order_admission.busy() else None
+
+# --- MENU BROADCAST ---
+# Emails the "menu is live" announcement to every Active subscriber. The list
+# is paged out of the sheet, grouped into batches that go out as one Brevo call
+# each (one messageVersion per recipient), and sent by a small worker pool
+# behind a token bucket. Every delivered recipient is checkpointed in
+# broadcast_recipients, so re-running a campaign picks up where it stopped.
+# It runs from `flask broadcast-menu` only: on Vercel a background thread is
+# frozen between requests and the checkpoint in /tmp dies with the instance.
+SITE_URL = 'https://aiarabakery.com'
+BROADCAST_SUBJECT = "🍞 The Aiara Bakery menu is live!"
+BROADCAST_BATCH_SIZE = int(os.environ.get('BROADCAST_BATCH_SIZE', '50'))
+BROADCAST_RATE_PER_SECOND = float(os.environ.get('BROADCAST_RATE_PER_SECOND', '5'))
+BROADCAST_WORKERS = int(os.environ.get('BROADCAST_WORKERS', '4'))
+BROADCAST_PAGE_ROWS = 500
+BROADCAST_MAX_ATTEMPTS = 4
+
+_broadcast_local = threading.local()
+_broadcasts_running = set()
+_broadcasts_lock = threading.Lock()
+
+def iter_active_subscribers(page_rows=BROADCAST_PAGE_ROWS):
+    # An email can be on several rows (signed up again, edited by hand). An
+    # Unsubscribed row anywhere wins, so every page is read before yielding.
+    active, unsubscribed = {}, set()
+    first_row = 2
+    while True:
+        page_range = f"'Subscribers'!A{first_row}:C{first_row + page_rows - 1}"
+        rows = get_sheet().values_get(page_range).get('values', [])
+        if not rows:
+            break
+        for values in rows:
+            email = str(values[1]).strip().lower() if len(values) > 2 else ''
+            if not email:
+                continue
+            if values[2] == 'Unsubscribed':
+                unsubscribed.add(email)
+            elif values[2] == 'Active':
+                active.setdefault(email, None)
+        first_row += page_rows
+    for email in active:
+        if email not in unsubscribed:
+            yield email
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def default_campaign_id():
+    bake_date = str(get_settings().get('Next Bake Date', '')).replace('/', '-').strip()
+    return f"menu-{bake_date or datetime.now(ZoneInfo('America/New_York')).strftime('%m-%d-%Y')}"
+
+def _send_broadcast_batch(campaign, subject, template, recipients, bucket):
+    # One render per batch; Brevo substitutes each recipient's params
+    items, details = get_menu_page_data()
+    _, _, deadline_text = get_bake_settings()
+    html_content = template.render(items=items, details=details, deadline_text=deadline_text, site_url=SITE_URL)
+    payload = {
+        "sender": BREVO_SENDER,
+        "subject": subject,
+        "htmlContent": html_content,
+        "messageVersions": [
+            {"to": [{"email": email}], "params": {"unsubscribe_url": f"{SITE_URL}/unsubscribe?email={quote(email)}"}}
+            for email in recipients
+        ]
+    }
+
+    brevo = getattr(_broadcast_local, 'brevo', None)
+    if brevo is None:
+        brevo = _broadcast_local.brevo = BrevoConnection()
+    for attempt in range(1, BROADCAST_MAX_ATTEMPTS + 1):
+        bucket.acquire()
+        try:
+            result = brevo.post(payload)
+            break
+        except Exception as e:
+            if not getattr(e, 'retryable', True) or attempt == BROADCAST_MAX_ATTEMPTS:
+                print(f"Broadcast Error ({campaign}, {len(recipients)} recipients): {e}")
+                return 0
+            time.sleep(OUTBOX_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.8, 1.2))
+
+    message_ids = result.get('messageIds') or []
+    now = time.time()
+    with local_transaction() as db:
+        db.executemany(
+            "INSERT OR IGNORE INTO broadcast_recipients (campaign, email, sent_at, message_id) VALUES (?, ?, ?, ?)",
+            [(campaign, email, now, message_ids[i] if i < len(message_ids) else None) for i, email in enumerate(recipients)]
+        )
+    return len(recipients)
+
+def run_broadcast(campaign, subject=BROADCAST_SUBJECT):
+    with _broadcasts_lock:
+        if campaign in _broadcasts_running:
+            raise RuntimeError(f"Broadcast {campaign} is already running")
+        _broadcasts_running.add(campaign)
+    try:
+        with local_transaction() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO broadcasts (campaign, subject, started_at, status) VALUES (?, ?, ?, 'running')",
+                (campaign, subject, time.time())
+            )
+            db.execute("UPDATE broadcasts SET status = 'running', subject = ? WHERE campaign = ?", (subject, campaign))
+        already_sent = {row[0] for row in local_db().execute(
+            "SELECT email FROM broadcast_recipients WHERE campaign = ?", (campaign,)
+        )}
+        template = app.jinja_env.get_template('menu_live_email.html')
+        bucket = TokenBucket(BROADCAST_RATE_PER_SECOND)
+        recipients = (email for email in iter_active_subscribers() if email not in already_sent)
+        totals = Counter(skipped=len(already_sent))
+
+        def collect(futures):
+            for future in futures:
+                totals['sent'] += future.result()
+
+        with ThreadPoolExecutor(BROADCAST_WORKERS) as pool:
+            in_flight = set()
+            for batch in _batched(recipients, BROADCAST_BATCH_SIZE):
+                totals['queued'] += len(batch)
+                in_flight.add(pool.submit(_send_broadcast_batch, campaign, subject, template, batch, bucket))
+                # Keep only a few batches ahead of the senders instead of the whole list
+                if len(in_flight) >= BROADCAST_WORKERS * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+            collect(in_flight)
+
+        totals['failed'] = totals['queued'] - totals['sent']
+        with local_transaction() as db:
+            db.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = ? WHERE campaign = ?",
+                ('done' if totals['failed'] == 0 else 'incomplete', time.time(), campaign)
+            )
+        print(f"Broadcast {campaign}: {dict(totals)}")
+        return totals
+    finally:
+        with _broadcasts_lock:
+            _broadcasts_running.discard(campaign)
+
+def broadcast_status(campaign):
+    db = local_db()
+    row = db.execute("SELECT * FROM broadcasts WHERE campaign = ?", (campaign,)).fetchone()
+    if row is None:
+        return None
+    sent = db.execute("SELECT COUNT(*) FROM broadcast_recipients WHERE campaign = ?", (campaign,)).fetchone()[0]
+    return dict(row, sent=sent)
+
+# --- PRODUCTION REPORT ---
+# Loaf totals for bake prep. Each Orders row is parsed once into
+# production_orders/production_lines; later runs read only the rows appended
+# since the cursor in sheet_cursors. As with the worksheet indexes, the tail
+# read starts at the cursor row and a mismatch there triggers a full rebuild.
+# The report itself is a GROUP BY over the orders placed in the bake's cycle.
+PRODUCTION_CYCLE_DAYS = int(os.environ.get('PRODUCTION_CYCLE_DAYS', '7'))
+VIP_SIZE_PATTERN = re.compile(r'^(.*?)\s*\[([^\]]*)\]\s*$')
+ORDER_TIMESTAMP_FORMATS = ["%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%Y-%m-%d %H:%M:%S"]
+
+_production_lock = threading.Lock()
+
+def _order_timestamp(value):
+    for fmt in ORDER_TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    return None
+
+def _production_order(row_number, values):
+    # Orders columns: Timestamp, Name, Contact, Order, Logistics, Details, Subscription, Notes, Total, Payment
+    values = values + [''] * (10 - len(values))
+    summary = str(values[3]).strip()
+    if not summary:
+        return None
+    # /vip-submit appends the subscriber's loaf size as "... [Large Loaf (1kg)]"
+    vip_size = None
+    match = VIP_SIZE_PATTERN.match(summary)
+    if match:
+        summary, vip_size = match.group(1), match.group(2)
+    return (
+        (row_number, _order_timestamp(values[0]), str(values[4]).strip() or 'N/A', str(values[5]).strip() or 'N/A', vip_size, summary),
+        [(row_number, item, qty) for qty, item in parse_order_summary(summary)]
+    )
+
+def _store_production_rows(db, first_row, rows):
+    for offset, values in enumerate(rows):
+        parsed = _production_order(first_row + offset, values) if first_row + offset > 1 else None
+        if parsed:
+            order, lines = parsed
+            db.execute("INSERT OR REPLACE INTO production_orders VALUES (?, ?, ?, ?, ?, ?)", order)
+            db.execute("DELETE FROM production_lines WHERE row = ?", (order[0],))
+            db.executemany("INSERT INTO production_lines VALUES (?, ?, ?)", lines)
+    if rows:
+        db.execute(
+            "INSERT OR REPLACE INTO sheet_cursors VALUES ('Orders', ?, ?)",
+            (first_row + len(rows) - 1, json.dumps(rows[-1]))
+        )
+
+def refresh_production_orders(rebuild=False):
+    # Returns how many Orders rows were parsed
+    with _production_lock:
+        cursor = local_db().execute("SELECT last_row, last_row_values FROM sheet_cursors WHERE worksheet = 'Orders'").fetchone()
+        if cursor and not rebuild:
+            values = get_sheet().values_get(f"'Orders'!A{cursor['last_row']}:J").get('values', [])
+            if values and values[0][:ORDER_CURSOR_COLUMNS] == json.loads(cursor['last_row_values'])[:ORDER_CURSOR_COLUMNS]:
+                with local_transaction() as db:
+                    _store_production_rows(db, cursor['last_row'] + 1, values[1:])
+                return len(values) - 1
+            print(f"Production Report: Orders row {cursor['last_row']} changed, rebuilding")
+
+        values = get_sheet().values_get("'Orders'!A:J").get('values', [])
+        with local_transaction() as db:
+            db.execute("DELETE FROM production_orders")
+            db.execute("DELETE FROM production_lines")
+            db.execute("DELETE FROM sheet_cursors WHERE worksheet = 'Orders'")
+            _store_production_rows(db, 1, values)
+        return len(values)
+
+def production_report(since=None, until=None, rebuild=False):
+    # Defaults to the orders placed in the PRODUCTION_CYCLE_DAYS before the next bake day
+    try:
+        flush_orders()
+    except Exception as e:
+        print(f"Production Report Flush Error: {e}")
+    parsed = refresh_production_orders(rebuild)
+
+    bake_date_dt, _, _ = get_bake_settings()
+    until = until or bake_date_dt.replace(hour=0, minute=0, second=0, tzinfo=None)
+    since = since or until - timedelta(days=PRODUCTION_CYCLE_DAYS)
+    period = (since.strftime("%Y-%m-%d %H:%M:%S"), until.strftime("%Y-%m-%d %H:%M:%S"))
+    in_period = "FROM production_orders o {} WHERE o.ordered_at >= ? AND o.ordered_at < ?"
+    with_lines = in_period.format("JOIN production_lines l ON l.row = o.row")
+    db = local_db()
+
+    windows = {}
+    for r in db.execute(f"SELECT o.logistics, o.pickup_window, COUNT(*) AS orders {in_period.format('')} GROUP BY 1, 2 ORDER BY 1, 2", period):
+        windows.setdefault(r['logistics'], {})[r['pickup_window']] = {'orders': r['orders'], 'items': {}}
+    for r in db.execute(f"SELECT o.logistics, o.pickup_window, l.item, SUM(l.quantity) AS quantity {with_lines} GROUP BY 1, 2, 3 ORDER BY 1, 2, 3", period):
+        windows[r['logistics']][r['pickup_window']]['items'][r['item']] = r['quantity']
+
+    vip_sizes = {}
+    for r in db.execute(f"SELECT o.vip_size, l.item, SUM(l.quantity) AS quantity {with_lines} AND o.vip_size IS NOT NULL GROUP BY 1, 2 ORDER BY 1, 2", period):
+        vip_sizes.setdefault(r['vip_size'], {})[r['item']] = r['quantity']
+
+    return {
+        'since': period[0],
+        'until': period[1],
+        'rows_parsed': parsed,
+        'orders': db.execute(f"SELECT COUNT(*) {in_period.format('')}", period).fetchone()[0],
+        'items': {r['item']: r['quantity'] for r in db.execute(
+            f"SELECT l.item, SUM(l.quantity) AS quantity {with_lines} GROUP BY 1 ORDER BY 2 DESC, 1", period
+        )},
+        'windows': windows,
+        'vip_sizes': vip_sizes,
+        # Orders whose summary had no "Nx Item" parts; these need a human look
+        'unparsed': [dict(r) for r in db.execute(
+            f"SELECT o.row, o.summary {in_period.format('')} AND NOT EXISTS "
+            "(SELECT 1 FROM production_lines l WHERE l.row = o.row) ORDER BY o.row", period
+        )],
+    }
+
 def send_bakery_email(subject, recipient, name=None, total="0.00"):
     try:
         _, _, deadline_text = get_bake_settings()
@@ -82,24 +2264,8 @@ def send_bakery_email(subject, recipient, name=None, total="0.00"):
                 </body>
             </html>
         """
-        
-        url = "https://api.brevo.com/v3/smtp/email"
-        api_key = os.environ.get('BREVO_API_KEY')
-        
-        data = {
-            "sender": {"name": "Aiara Bakery", "email": "greg@aiarabakery.com"},
-            "to": [{"email": recipient}],
-            "subject": subject,
-            "htmlContent": html_content
-        }
-        
-        req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), method='POST')
-        req.add_header('api-key', api_key)
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('Accept', 'application/json')
-        
-        with urllib.request.urlopen(req) as response:
-            print(f"Email sent: {response.status}")
+
+        enqueue_email(brevo_message(subject, recipient, html_content), "order confirmation")
             
     except Exception as e:
         print(f"Brevo API Error: {e}")
@@ -131,50 +2297,52 @@ def send_subscription_email(subject, recipient, name=None):
                 </body>
             </html>
         """
-        
-        url = "https://api.brevo.com/v3/smtp/email"
-        api_key = os.environ.get('BREVO_API_KEY')
-        
-        data = {
-            "sender": {"name": "Aiara Bakery", "email": "greg@aiarabakery.com"},
-            "to": [{"email": recipient}],
-            "subject": subject,
-            "htmlContent": html_content
-        }
-        
-        req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), method='POST')
-        req.add_header('api-key', api_key)
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('Accept', 'application/json')
-        
-        with urllib.request.urlopen(req) as response:
-            print(f"Subscription Email sent: {response.status}")
+
+        enqueue_email(brevo_message(subject, recipient, html_content), "subscription welcome")
             
     except Exception as e:
         print(f"Brevo Subscription API Error: {e}")
 
+def send_order_status_email(recipient, orders):
+    # Sent whether or not there are orders, so the lookup doesn't tell anyone which emails ordered
+    try:
+        if orders:
+            rows = "".join(f"""
+                            <div style="border-top: 1px solid #eee; padding: 15px 0;">
+                                <strong>{escape(o['summary'])}</strong> &middot; {escape(o['payment'])}<br>
+                                <small>Placed {escape(o['placed'])}</small><br>
+                                <small>{escape(o['logistics'])}{f" &middot; {escape(o['pickup_window'])}" if o['pickup_window'] and o['pickup_window'] != 'N/A' else ""}</small>
+                            </div>""" for o in orders)
+            body = f"<p>Here are your most recent orders and where their payment stands:</p>{rows}"
+        else:
+            body = "<p>We couldn't find any orders placed with this email. If you ordered with a different address, look that one up instead.</p>"
+        html_content = f"""
+            <html>
+                <body style="font-family: sans-serif; line-height: 1.6; color: #333;">
+                    <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #eee; border-radius: 8px;">
+                        <h2 style="color: #d4a373;">Your Aiara Bakery Orders</h2>
+                        {body}
+                        <p>Didn't ask for this? Someone entered your email on our order lookup; you can ignore it.</p>
+                        <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
+                        <small style="color: #888;">Aiara Bakery</small>
+                    </div>
+                </body>
+            </html>
+        """
+
+        enqueue_email(brevo_message("🍞 Your Aiara Bakery Orders", recipient, html_content), "order status")
+
+    except Exception as e:
+        print(f"Brevo Order Status API Error: {e}")
+
 @app.route('/')
 def home():
+    shed = shed_page_load()
+    if shed is not None:
+        return shed
     try:
-        sheet = get_sheet()
-        items = sheet.worksheet("Menu").get_all_records()
-        visible_items = [i for i in items if i.get('Status') == 'Active']
-        
-        settings = {}
-        for i in sheet.worksheet("Settings").get_all_records():
-            if i.get('Setting Name'):
-                settings[i['Setting Name']] = i['Value']
-        
-        if settings.get('Pickup Windows'):
-            settings['window_list'] = [w.strip() for w in settings['Pickup Windows'].split(',')]
-            
-        if settings.get('DC Pickup Windows'):
-            settings['dc_window_list'] = [w.strip() for w in settings['DC Pickup Windows'].split(',')]
-
-        if settings.get('WWS (Pickup) Info'):
-            settings['wws_window_list'] = [w.strip() for w in settings['WWS (Pickup) Info'].split(',')]
-            
-        return render_template('index.html', items=visible_items, details=settings)
+        visible_items, settings = get_menu_page_data()
+        return render_cached_page('index.html', items=visible_items, details=settings)
     except Exception as e:
         return f"""
             <div style="padding: 50px; font-family: sans-serif; text-align: center;">
@@ -185,6 +2353,7 @@ def home():
         """
 
 @app.route('/submit', methods=['POST'])
+@admission_controlled
 def submit():
     try:
         name = request.form.get('name')
@@ -196,12 +2365,7 @@ def submit():
         _, deadline_dt, deadline_text = get_bake_settings()
         is_late = timestamp > deadline_dt
 
-        sheet = get_sheet()
-        
-        settings = {}
-        for i in sheet.worksheet("Settings").get_all_records():
-            if i.get('Setting Name'):
-                settings[i['Setting Name']] = i['Value']
+        settings = get_settings()
 
         logistics_choice = request.form.get('logistics')
         
@@ -217,23 +2381,33 @@ def submit():
         # Check if they opted into the subscription
         is_subscribing = True if request.form.get('subscription') else False
 
-        sheet.worksheet("Orders").append_row([
-            timestamp.strftime("%m/%d/%Y %H:%M:%S"), name, contact, order_summary, 
-            request.form.get('logistics'), logistics_details,
-            "Yes" if is_subscribing else "No", request.form.get('notes'),
-            f"${order_total}", "Pending"
-        ], value_input_option='USER_ENTERED')
+        try:
+            reservation = inventory.reserve(parse_order_summary(order_summary))
+        except OutOfStock as e:
+            return f"""
+                <div style="padding: 50px; font-family: sans-serif; text-align: center;">
+                    <h2 style="color: #c53030;">Sorry, we can't fill that order</h2>
+                    <p>{escape(str(e))}</p>
+                    <p>Please <a href="/">head back to the menu</a> and adjust your order.</p>
+                </div>
+            """, 409
+
+        try:
+            record_order([
+                timestamp.strftime("%m/%d/%Y %H:%M:%S"), name, contact, order_summary, 
+                request.form.get('logistics'), logistics_details,
+                "Yes" if is_subscribing else "No", request.form.get('notes'),
+                f"${order_total}", "Pending"
+            ])
+        except Exception:
+            inventory.release(reservation)
+            raise
 
         if request.form.get('join_list'):
-            sub_sheet = sheet.worksheet("Subscribers")
-            
             try:
-                existing_emails = sub_sheet.col_values(2)
-            except Exception:
-                existing_emails = []
-                
-            if contact not in existing_emails:
-                sub_sheet.append_row([timestamp.strftime("%m/%d/%Y %H:%M:%S"), contact, 'Active'], value_input_option='USER_ENTERED')     
+                add_subscriber(contact, timestamp)
+            except Exception as e:
+                print(f"Subscribe Error: {e}")
                 
         # Send standard confirmation email
         send_bakery_email("🍞 Aiara Bakery Order Received!", contact, name, order_total)
@@ -254,20 +2428,7 @@ def subscribe():
             return redirect(url_for('home'))
 
         timestamp = datetime.now(ZoneInfo('America/New_York'))
-        sheet = get_sheet()
-        sub_sheet = sheet.worksheet("Subscribers")
-        
-        try:
-            existing_emails = sub_sheet.col_values(2)
-        except Exception:
-            existing_emails = []
-
-        if email not in existing_emails:
-            sub_sheet.append_row([
-                timestamp.strftime("%m/%d/%Y %H:%M:%S"), 
-                email, 
-                'Active'
-            ], value_input_option='USER_ENTERED')
+        add_subscriber(email, timestamp)
             
         return render_template('subscribe_success.html', email=email)
         
@@ -278,9 +2439,57 @@ def subscribe():
 @app.route('/unsubscribe', methods=['GET', 'POST'])
 def unsubscribe():
     if request.method == 'POST':
+        try:
+            contact = (request.form.get('contact') or '').strip().lower()
+            if contact:
+                unsubscribe_subscriber(contact)
+        except Exception as e:
+            print(f"Unsubscribe Error: {e}")
         return redirect(url_for('home'))
     return render_template('unsubscribe.html')
 
+@app.route('/my-orders', methods=['GET', 'POST'])
+def my_orders():
+    if request.method == 'GET':
+        return render_template('my_orders.html')
+    # The status goes to the email itself, never to whoever typed it in
+    contact = (request.form.get('contact') or '').strip().lower()
+    if '@' not in contact:
+        return render_template('my_orders.html'), 200, {'Cache-Control': 'private, no-store'}
+    client = (request.headers.get('X-Forwarded-For') or request.remote_addr or '').split(',')[0].strip()
+    if not allow_order_lookup(client) or not allow_order_lookup(contact):
+        page = render_template('my_orders.html', contact=contact, error=True)
+        return page, 429, {'Cache-Control': 'private, no-store', 'Retry-After': '60'}
+    try:
+        orders = lookup_orders(contact)
+    except Exception as e:
+        print(f"Order Lookup Error: {e}")
+        page = render_template('my_orders.html', contact=contact, error=True)
+        return page, 200, {'Cache-Control': 'private, no-store'}
+    send_order_status_email(contact, orders)
+    return render_template('my_orders.html', contact=contact), 200, {'Cache-Control': 'private, no-store'}
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    if filename in asset_manifest.values():
+        response = send_from_directory(ASSET_OUTPUT_DIR, filename)
+        response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+        return response
+    # The unhashed source, for names the manifest doesn't cover; it can change under the same URL
+    if '/' in filename or not filename.endswith(ASSET_TYPES):
+        abort(404)
+    response = send_from_directory(ASSET_SOURCE_DIR, filename)
+    response.headers['Cache-Control'] = ASSET_FALLBACK_CACHE_CONTROL
+    return response
+
+@app.route('/waiting-room/<ticket>')
+def waiting_room_status(ticket):
+    status = order_admission.status(ticket)
+    if status is None:
+        # Expired or issued by another instance; the page resubmits and rejoins the line
+        status = {'admitted': False, 'expired': True}
+    return jsonify(dict(status, retry_after=ADMISSION_POLL_SECONDS)), 200, {'Cache-Control': 'no-store'}
+
 def send_vip_email(subject, recipient, name=None):
     try:
         html_content = f"""
@@ -301,81 +2510,37 @@ def send_vip_email(subject, recipient, name=None):
                 </body>
             </html>
         """
-        
-        url = "https://api.brevo.com/v3/smtp/email"
-        api_key = os.environ.get('BREVO_API_KEY')
-        
-        data = {
-            "sender": {"name": "Aiara Bakery", "email": "greg@aiarabakery.com"},
-            "to": [{"email": recipient}],
-            "subject": subject,
-            "htmlContent": html_content
-        }
-        
-        req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), method='POST')
-        req.add_header('api-key', api_key)
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('Accept', 'application/json')
-        
-        with urllib.request.urlopen(req) as response:
-            print(f"VIP Email sent: {response.status}")
+
+        enqueue_email(brevo_message(subject, recipient, html_content), "vip confirmation")
             
     except Exception as e:
         print(f"Brevo VIP API Error: {e}")
 
 @app.route('/early-access')
 def early_access():
+    shed = shed_page_load()
+    if shed is not None:
+        return shed
     try:
-        sheet = get_sheet()
-        items = sheet.worksheet("Menu").get_all_records()
-        visible_items = [i for i in items if i.get('Status') == 'Active']
-        
-        settings = {}
-        for i in sheet.worksheet("Settings").get_all_records():
-            if i.get('Setting Name'):
-                settings[i['Setting Name']] = i['Value']
-        
-        settings['Store Status'] = 'Open' 
-        
-        if settings.get('Pickup Windows'):
-            settings['window_list'] = [w.strip() for w in settings['Pickup Windows'].split(',')]
-            
-        if settings.get('DC Pickup Windows'):
-            settings['dc_window_list'] = [w.strip() for w in settings['DC Pickup Windows'].split(',')]
-
-        if settings.get('WWS (Pickup) Info'):
-            settings['wws_window_list'] = [w.strip() for w in settings['WWS (Pickup) Info'].split(',')]
-            
-        return render_template('index.html', items=visible_items, details=settings)
+        visible_items, settings = get_menu_page_data()
+        settings['Store Status'] = 'Open'
+        return render_cached_page('index.html', items=visible_items, details=settings)
     except Exception as e:
         return f"Error: {e}"
 
 @app.route('/vip')
 def vip():
+    shed = shed_page_load()
+    if shed is not None:
+        return shed
     try:
-        sheet = get_sheet()
-        items = sheet.worksheet("Menu").get_all_records()
-        visible_items = [i for i in items if i.get('Status') == 'Active']
-        
-        settings = {}
-        for i in sheet.worksheet("Settings").get_all_records():
-            if i.get('Setting Name'):
-                settings[i['Setting Name']] = i['Value']
-        
-        if settings.get('Pickup Windows'):
-            settings['window_list'] = [w.strip() for w in settings['Pickup Windows'].split(',')]
-            
-        if settings.get('DC Pickup Windows'):
-            settings['dc_window_list'] = [w.strip() for w in settings['DC Pickup Windows'].split(',')]
-
-        if settings.get('WWS (Pickup) Info'):
-            settings['wws_window_list'] = [w.strip() for w in settings['WWS (Pickup) Info'].split(',')]
-            
-        return render_template('vip.html', items=visible_items, details=settings)
+        visible_items, settings = get_menu_page_data()
+        return render_cached_page('vip.html', items=visible_items, details=settings)
     except Exception as e:
         return f"Error: {e}"
 
 @app.route('/vip-submit', methods=['POST'])
+@admission_controlled
 def vip_submit():
     try:
         name = request.form.get('name')
@@ -383,28 +2548,37 @@ def vip_submit():
         base_summary = request.form.get('order_summary')
         timestamp = datetime.now(ZoneInfo('America/New_York'))
         
-        sheet = get_sheet()
-        
         # --- VIP SIZE LOOKUP LOGIC ---
-        loaf_size = "Size Unknown"
         try:
-            sub_sheet = sheet.worksheet("Bread Subscriptions")
-            sub_records = sub_sheet.get_all_records()
-            for row in sub_records:
-                if str(row.get('Email', '')).strip().lower() == contact:
-                    loaf_size = row.get('Size', 'Size Unknown')
-                    break
+            vip_entry = vip_index.get(contact)
         except Exception as e:
             print(f"Subscription lookup error: {e}")
+            vip_entry = {'size': "Size Unknown", 'status': 'Active'}
+
+        if vip_entry is None:
+            return f"""
+                <div style="padding: 50px; font-family: sans-serif; text-align: center;">
+                    <h2 style="color: #c53030;">We couldn't find you on the VIP roster</h2>
+                    <p>No weekly subscription is registered to <strong>{escape(contact)}</strong>.</p>
+                    <p>Please use the email you subscribed with, or order from the <a href="/">regular menu</a>.</p>
+                </div>
+            """, 403
+        if str(vip_entry['status']).strip().lower() != 'active':
+            # VIP orders are recorded as prepaid, so a paused or cancelled subscription can't place one
+            return f"""
+                <div style="padding: 50px; font-family: sans-serif; text-align: center;">
+                    <h2 style="color: #c53030;">Your weekly subscription isn't active</h2>
+                    <p>The subscription for <strong>{escape(contact)}</strong> is {escape(vip_entry['status'] or 'not active')}.</p>
+                    <p>Reply to your welcome email to restart it, or order from the <a href="/">regular menu</a>.</p>
+                </div>
+            """, 403
+        loaf_size = vip_entry['size']
             
         # Append the found size to the item they chose
         order_summary = f"{base_summary} [{loaf_size}]"
         # ------------------------------
 
-        settings = {}
-        for i in sheet.worksheet("Settings").get_all_records():
-            if i.get('Setting Name'):
-                settings[i['Setting Name']] = i['Value']
+        settings = get_settings()
 
         logistics_choice = request.form.get('logistics')
         
@@ -417,12 +2591,12 @@ def vip_submit():
         else:
             logistics_details = "N/A"
 
-        sheet.worksheet("Orders").append_row([
+        record_order([
             timestamp.strftime("%m/%d/%Y %H:%M:%S"), name, contact, order_summary, 
             request.form.get('logistics'), logistics_details,
             "Yes (VIP Roster)", request.form.get('notes'),
             "VIP Prepaid", "Paid"
-        ], value_input_option='USER_ENTERED')
+        ])
 
         send_vip_email("🍞 Aiara Bakery VIP Order Confirmed!", contact, name)
 
@@ -437,11 +2611,7 @@ def success():
         total = request.args.get('total', '0.00')
         is_late = request.args.get('is_late') == 'True'
 
-        sheet = get_sheet()
-        settings = {}
-        for i in sheet.worksheet("Settings").get_all_records():
-            if i.get('Setting Name'):
-                settings[i['Setting Name']] = i['Value']
+        settings = get_settings()
 
         _, _, deadline_text = get_bake_settings()
         msg = f"Your order is in! (Note: It arrived after the {deadline_text} cutoff, so we will confirm your bake day shortly.)" if is_late else f"Thanks {name}, your order is confirmed for our next bake day!"
@@ -455,15 +2625,263 @@ def vip_success():
     try:
         name = request.args.get('name', '')
         
-        sheet = get_sheet()
-        settings = {}
-        for i in sheet.worksheet("Settings").get_all_records():
-            if i.get('Setting Name'):
-                settings[i['Setting Name']] = i['Value']
+        settings = get_settings()
 
         return render_template('vip_success.html', name=name, details=settings)
     except Exception as e:
         return f"Error: {e}"
 
+def _prometheus_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _prometheus_labels(**labels):
+    return '{' + ','.join(f'{k}="{_prometheus_value(v)}"' for k, v in labels.items()) + '}'
+
+def _prometheus_histogram(lines, name, histogram, **labels):
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f"{name}_bucket{_prometheus_labels(**labels, le=bound)} {count}")
+    lines.append(f"{name}_bucket{_prometheus_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_prometheus_labels(**labels)} {histogram.total:.6f}")
+    lines.append(f"{name}_count{_prometheus_labels(**labels)} {histogram.count}")
+
+@app.route('/metrics')
+def metrics():
+    if not is_admin_request():
+        abort(403)
+    lines = []
+    with _metrics_lock:
+        lines.append("# TYPE aiara_request_duration_seconds histogram")
+        for (route, method, status), histogram in sorted(route_latency.items()):
+            _prometheus_histogram(lines, 'aiara_request_duration_seconds', histogram, route=route, method=method, status=status)
+        lines.append("# TYPE aiara_external_call_duration_seconds histogram")
+        for kind, histogram in sorted(external_latency.items()):
+            _prometheus_histogram(lines, 'aiara_external_call_duration_seconds', histogram, service=kind)
+        lines.append("# TYPE aiara_external_call_errors_total counter")
+        for (kind, error), count in sorted(external_errors.items()):
+            lines.append(f"aiara_external_call_errors_total{_prometheus_labels(service=kind, error=error)} {count}")
+        lines.append("# TYPE aiara_sheets_quota_errors_total counter")
+        lines.append(f"aiara_sheets_quota_errors_total {external_errors[('sheets', '429')]}")
+        lines.append("# TYPE aiara_startup_seconds gauge")
+        for phase, seconds in sorted(startup_timings.items()):
+            lines.append(f"aiara_startup_seconds{_prometheus_labels(phase=phase)} {seconds:.6f}")
+
+    scheduler = sheets_scheduler.stats()
+    lines.append("# TYPE aiara_sheets_requests_coalesced_total counter")
+    lines.append(f"aiara_sheets_requests_coalesced_total {scheduler.get('coalesced', 0)}")
+    lines.append("# TYPE aiara_sheets_retries_total counter")
+    lines.append(f"aiara_sheets_retries_total {scheduler.get('retries', 0)}")
+    lines.append("# TYPE aiara_sheets_queued_requests gauge")
+    lines.append(f"aiara_sheets_queued_requests {scheduler['queued']}")
+
+    cache = sheet_cache.stats()
+    lines.append("# TYPE aiara_sheet_cache_requests_total counter")
+    for result in ('hits', 'stale_hits', 'misses'):
+        lines.append(f"aiara_sheet_cache_requests_total{_prometheus_labels(result=result)} {cache[result]}")
+    lines.append("# TYPE aiara_sheet_cache_refreshes_total counter")
+    lines.append(f"aiara_sheet_cache_refreshes_total{_prometheus_labels(result='ok')} {cache['refreshes']}")
+    lines.append(f"aiara_sheet_cache_refreshes_total{_prometheus_labels(result='error')} {cache['refresh_errors']}")
+    lines.append("# TYPE aiara_page_cache_requests_total counter")
+    for result in ('hits', 'misses', 'coalesced', 'not_modified', 'shed'):
+        lines.append(f"aiara_page_cache_requests_total{_prometheus_labels(result=result)} {page_cache_stats[result]}")
+
+    admission = order_admission.stats()
+    lines.append("# TYPE aiara_order_admission_total counter")
+    for result in ('admitted', 'queued', 'abandoned', 'unclaimed'):
+        lines.append(f"aiara_order_admission_total{_prometheus_labels(result=result)} {admission.get(result, 0)}")
+    lines.append("# TYPE aiara_order_admission_slots gauge")
+    for state in ('active', 'waiting', 'held'):
+        lines.append(f"aiara_order_admission_slots{_prometheus_labels(state=state)} {admission[state]}")
+
+    stock = inventory.stats()
+    lines.append("# TYPE aiara_inventory_reservations_total counter")
+    lines.append(f"aiara_inventory_reservations_total{_prometheus_labels(result='accepted')} {stock['reservations']}")
+    lines.append(f"aiara_inventory_reservations_total{_prometheus_labels(result='rejected')} {stock['rejections']}")
+    lines.append("# TYPE aiara_inventory_oversold_total counter")
+    for item, qty in sorted(stock['oversold'].items()):
+        lines.append(f"aiara_inventory_oversold_total{_prometheus_labels(item=item)} {qty}")
+    try:
+        outbox = outbox_stats()['counts']
+        lines.append("# TYPE aiara_email_outbox_messages gauge")
+        for status, count in sorted(outbox.items()):
+            lines.append(f"aiara_email_outbox_messages{_prometheus_labels(status=status)} {count}")
+        lines.append("# TYPE aiara_orders_pending gauge")
+        lines.append(f"aiara_orders_pending {pending_order_count()}")
+    except sqlite3.Error as e:
+        print(f"Metrics Error: {e}")
+
+    return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/admin/cache/invalidate', methods=['POST'])
+def admin_cache_invalidate():
+    if not is_admin_request():
+        abort(403)
+    names = request.args.getlist('sheet') or request.form.getlist('sheet')
+    sheet_cache.invalidate(*names)
+    return jsonify(invalidated=names or 'all', stats=sheet_cache.stats())
+
+@app.route('/admin/cache/stats')
+def admin_cache_stats():
+    if not is_admin_request():
+        abort(403)
+    return jsonify(sheet_cache.stats())
+
+@app.route('/admin/outbox')
+def admin_outbox():
+    if not is_admin_request():
+        abort(403)
+    return jsonify(outbox_stats())
+
+@app.route('/admin/inventory')
+def admin_inventory():
+    if not is_admin_request():
+        abort(403)
+    return jsonify(inventory.stats())
+
+@app.route('/admin/orders/flush', methods=['POST'])
+def admin_orders_flush():
+    if not is_admin_request():
+        abort(403)
+    flushed = flush_orders()
+    return jsonify(flushed=flushed, pending=pending_order_count())
+
+@app.cli.command('flush-orders')
+def flush_orders_command():
+    """Append every journaled order to the Orders sheet, then exit."""
+    print(f"Flushed {flush_orders()} order(s), {pending_order_count()} still pending")
+
+def _report_date(value):
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+@app.route('/admin/production')
+def admin_production():
+    if not is_admin_request():
+        abort(403)
+    try:
+        since, until = _report_date(request.args.get('since')), _report_date(request.args.get('until'))
+    except ValueError:
+        return jsonify(error="since/until must be YYYY-MM-DD"), 400
+    return jsonify(production_report(since, until, rebuild=request.args.get('rebuild') == '1'))
+
+@app.cli.command('production-report')
+@click.option('--since', type=click.DateTime(["%Y-%m-%d"]), help="First order date to include. Defaults to one cycle before the bake.")
+@click.option('--until', type=click.DateTime(["%Y-%m-%d"]), help="Day after the last order date. Defaults to the next bake date.")
+@click.option('--rebuild', is_flag=True, help="Re-parse every Orders row instead of only new ones.")
+def production_report_command(since, until, rebuild):
+    """Print loaf totals per item, pickup window and VIP size for bake prep."""
+    report = production_report(since, until, rebuild)
+    print(f"Orders placed {report['since']} to {report['until']}: {report['orders']} ({report['rows_parsed']} new rows read)")
+    print("\nLoaves")
+    for item, quantity in report['items'].items():
+        print(f"  {quantity:>4}  {item}")
+    for logistics, windows in report['windows'].items():
+        print(f"\n{logistics}")
+        for window, totals in windows.items():
+            items = ', '.join(f"{quantity}x {item}" for item, quantity in totals['items'].items())
+            print(f"  {window}: {totals['orders']} order(s) - {items or 'nothing parsed'}")
+    if report['vip_sizes']:
+        print("\nVIP sizes")
+        for size, items in report['vip_sizes'].items():
+            print(f"  {size}: " + ', '.join(f"{quantity}x {item}" for item, quantity in items.items()))
+    for order in report['unparsed']:
+        print(f"\nCould not parse Orders row {order['row']}: {order['summary']!r}")
+
+@app.cli.command('broadcast-menu')
+@click.option('--campaign', help="Campaign id; re-use one to resume it. Defaults to the next bake date.")
+@click.option('--subject', default=BROADCAST_SUBJECT, show_default=True)
+@click.option('--status', is_flag=True, help="Show how far the campaign got instead of sending.")
+def broadcast_menu_command(campaign, subject, status):
+    """Email the live menu to every Active subscriber."""
+    if 'LOCAL_DB_PATH' not in os.environ:
+        raise click.ClickException("Set LOCAL_DB_PATH to a file that outlives this run; it records who has been sent the menu")
+    campaign = campaign or default_campaign_id()
+    if status:
+        progress = broadcast_status(campaign)
+        if progress is None:
+            raise click.ClickException(f"No broadcast {campaign} in {LOCAL_DB_PATH}")
+        print(json.dumps(progress, indent=2))
+        return
+    run_broadcast(campaign, subject)
+
+@app.cli.command('build-assets')
+@click.option('--check', is_flag=True, help="Exit non-zero if public/assets is out of date instead of rebuilding.")
+def build_assets_command(check):
+    """Minify assets/ into content-hashed files under public/assets."""
+    if check:
+        if build_assets(write=False) != load_asset_manifest():
+            raise click.ClickException("public/assets is out of date; run flask build-assets")
+        print("public/assets is up to date")
+        return
+    for name, filename in build_assets().items():
+        print(f"{name} -> {filename} ({os.path.getsize(os.path.join(ASSET_OUTPUT_DIR, filename))} bytes)")
+
+@app.cli.command('drain-outbox')
+def drain_outbox_command():
+    """Send every due email in the outbox, then exit."""
+    print(f"Delivered {drain_outbox()} message(s)")
+
+def _warm_menu_pages():
+    visible_items, settings = get_menu_page_data()
+    for endpoint, template in (('home', 'index.html'), ('vip', 'vip.html')):
+        render_cached_page(template, endpoint, items=visible_items, details=settings)
+
+@app.route('/admin/warmup', methods=['GET', 'POST'])
+def admin_warmup():
+    # Point a cron or a post-deploy hook here so the first customer doesn't pay
+    # for authorizing Sheets, filling the caches and rendering the menu pages
+    if not is_admin_request():
+        abort(403)
+    steps = [
+        ('sheets', get_sheet),
+        ('sheet_cache', get_menu_page_data),
+        ('subscriber_index', subscriber_index.warm),
+        ('vip_index', vip_index.warm),
+        ('order_index', order_index.warm),
+        ('local_store', local_db),
+        ('pages', _warm_menu_pages),
+        ('workers', lambda: (start_outbox_workers(), start_order_flusher())),
+    ]
+    timings, errors = {}, {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warmup Error ({name}): {e}")
+            errors[name] = str(e)
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return jsonify(steps_ms=timings, errors=errors, startup_ms={k: round(v * 1000, 1) for k, v in startup_timings.items()}), 500 if errors else 200
+
+@app.cli.command('startup-time')
+@click.option('--path', default='/unsubscribe', show_default=True, help="Route to request once the app has loaded.")
+@click.option('--runs', default=5, show_default=True)
+def startup_time_command(path, runs):
+    """Measure cold starts: import the app in fresh interpreters and time one request."""
+    script = (
+        "import json, sys; sys.path.insert(0, sys.argv[1]); import index; "
+        "index.app.test_client().get(sys.argv[2]); print(json.dumps(index.startup_timings))"
+    )
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', script, os.path.dirname(os.path.abspath(__file__)), path],
+            capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    for phase in samples[0]:
+        values = sorted(sample[phase] * 1000 for sample in samples)
+        print(f"{phase:<15} min {values[0]:8.1f}ms  median {values[len(values) // 2]:8.1f}ms  max {values[-1]:8.1f}ms")
+
+def precompile_templates():
+    # Compiling on import moves Jinja's parse/compile cost out of the first request
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+_templates_started = time.perf_counter()
+precompile_templates()
+startup_timings['templates'] = time.perf_counter() - _templates_started
+startup_timings['module'] = time.perf_counter() - STARTUP_STARTED
+if STARTUP_TIMING:
+    print("Startup: " + ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in startup_timings.items()))
+
 # Important for Vercel
 index = app
@@ -0,0 +1,6 @@
+function toggleLogistics() {
+    const val = document.getElementById('logistics').value;
+    document.getElementById('pickupArea').style.display = val === 'Clarksburg Resident (Pickup)' ? 'block' : 'none';
+    document.getElementById('dcArea').style.display = val === 'Washington, DC 29th St NW' ? 'block' : 'none';
+    document.getElementById('schoolArea').style.display = val === 'WWS (Pickup)' ? 'block' : 'none';
+}
@@ -0,0 +1,81 @@
+"""Local HTTP stand-in for Brevo's /v3/smtp/email endpoint.
+
+Accepts the same JSON the app posts, keeps connections alive like the real
+API, and can add latency or fail a fraction of requests with 503s. Tests can
+queue exact statuses with fail_next() and, with drop_connections, have every
+kept-alive connection closed behind the client's back once it's answered.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBrevo:
+    def __init__(self, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.recipients = 0
+        self.errors = 0
+        self.connections = set()
+        self.drop_connections = False
+        self._statuses = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v3/smtp/email"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def fail_next(self, *statuses):
+        with self._lock:
+            self._statuses.extend(statuses)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        brevo = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if brevo.latency:
+                    time.sleep(brevo.latency * random.uniform(0.8, 1.2))
+                versions = payload.get("messageVersions") or [payload]
+                with brevo._lock:
+                    brevo.requests += 1
+                    brevo.connections.add(self.client_address)
+                    failed = brevo._statuses.pop(0) if brevo._statuses else None
+                    if failed is None and brevo.error_rate and random.random() < brevo.error_rate:
+                        failed = 503
+                    if failed:
+                        brevo.errors += 1
+                    else:
+                        brevo.recipients += sum(len(v.get("to", [])) for v in versions)
+                if failed:
+                    status, body = failed, {"code": "bench_error", "message": f"Scripted {failed}"}
+                elif payload.get("messageVersions"):
+                    status, body = 201, {"messageIds": [f"<bench-{brevo.requests}-{i}>" for i in range(len(versions))]}
+                else:
+                    status, body = 201, {"messageId": f"<bench-{brevo.requests}>"}
+                encoded = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+                # Like an idle timeout on Brevo's side: no Connection: close, the socket just goes
+                self.close_connection = brevo.drop_connections
+
+        return Handler
@@ -0,0 +1,316 @@
+"""In-process stand-in for gspread and google-auth.
+
+install() registers fake ``gspread`` and ``google.*`` modules in sys.modules so
+that api/index.py imports them instead of the real libraries. Every API call
+goes through FakeHTTPClient.request, the same seam the app instruments, where
+latency, a per-minute quota (answered with 429s) and random 5xx errors are
+simulated. Tests queue exact failures for an endpoint with fail_next(), including
+ones answered only after the call was applied, as a 5xx from Sheets can be.
+Reads pass their range as ``params`` like gspread does, so the
+app's coalescing of identical in-flight reads behaves as it would for real.
+"""
+import random
+import re
+import sys
+import threading
+import time
+import types
+from collections import Counter
+
+DEFAULT_SHEETS = {
+    "Menu": [
+        ["Item Name", "Description", "Price", "Remaining", "Status"],
+        ["Country Sourdough", "Our everyday loaf", "12", "100000", "Active"],
+        ["Seeded Rye", "Dark and dense", "14", "100000", "Active"],
+        ["Sandwich Loaf", "Pan baked", "15", "100000", "Active"],
+        ["Focaccia", "Olive oil and rosemary", "10", "0", "Hidden"],
+    ],
+    "Settings": [
+        ["Setting Name", "Value"],
+        ["Next Bake Date", "12/31/2099"],
+        ["Store Status", "Open"],
+        ["Pickup Windows", "9-10am, 10-11am, 11-12pm"],
+        ["DC Pickup Windows", "5-6pm"],
+        ["WWS (Pickup) Info", "3:15pm"],
+    ],
+    "Orders": [
+        ["Timestamp", "Name", "Contact", "Order", "Logistics", "Details", "Subscription", "Notes", "Total", "Payment"],
+    ],
+    "Subscribers": [["Timestamp", "Email", "Status"]],
+    "Bread Subscriptions": [["Name", "Email", "Size", "Status"]],
+}
+
+
+class APIError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(f"APIError: [{status_code}]: {message}")
+        self.response = types.SimpleNamespace(status_code=status_code)
+
+
+class WorksheetNotFound(Exception):
+    pass
+
+
+def _column_number(letters):
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - 64
+    return number
+
+
+def _column_letters(number):
+    letters = ""
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def a1_to_rowcol(label):
+    match = re.match(r"^([A-Z]+)(\d+)$", label.upper())
+    return int(match.group(2)), _column_number(match.group(1))
+
+
+def rowcol_to_a1(row, col):
+    return f"{_column_letters(col)}{row}"
+
+
+def numericise(value):
+    if isinstance(value, str) and value != "":
+        for cast in (int, float):
+            try:
+                return cast(value)
+            except ValueError:
+                pass
+    return value
+
+
+def numericise_all(values, *args, **kwargs):
+    return [numericise(v) for v in values]
+
+
+class FakeHTTPClient:
+    def __init__(self, latency=0.0, quota_per_minute=None, error_rate=0.0):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.quota_errors = 0
+        self.injected_errors = 0
+        self._lock = threading.Lock()
+        self._window_started = time.monotonic()
+        self._window_calls = 0
+        self._failures = {}
+
+    def fail_next(self, endpoint, *statuses, applied=False):
+        # Each status answers one later call to endpoint; applied=True runs the call first
+        with self._lock:
+            self._failures.setdefault(endpoint, []).extend((status, applied) for status in statuses)
+
+    def request(self, method, endpoint, handler=None, **kwargs):
+        with self._lock:
+            self.calls[endpoint] += 1
+            now = time.monotonic()
+            if now - self._window_started >= 60:
+                self._window_started, self._window_calls = now, 0
+            self._window_calls += 1
+            over_quota = self.quota_per_minute is not None and self._window_calls > self.quota_per_minute
+            if over_quota:
+                self.quota_errors += 1
+            failure = self._failures[endpoint].pop(0) if self._failures.get(endpoint) else None
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.8, 1.2))
+        if over_quota:
+            raise APIError(429, "Quota exceeded for quota metric 'Read requests'")
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.injected_errors += 1
+            raise APIError(503, "The service is currently unavailable.")
+        if failure:
+            status, applied = failure
+            if applied:
+                handler()
+            raise APIError(status, "Injected by fail_next()")
+        return handler()
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = [list(r) for r in rows]
+
+    @property
+    def row_count(self):
+        return max(1000, len(self.rows))
+
+    def _call(self, endpoint, handler):
+        return self.spreadsheet.client.http_client.request("post", endpoint, handler=handler)
+
+    def _range(self, a1):
+        match = re.match(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$", a1 or "A1")
+        first = int(match.group(2) or 1)
+        if match.group(4):
+            last = int(match.group(4))
+        else:
+            # "B7" is a single cell; "A5:J" runs to the last row
+            last = first if a1 and match.group(2) and not match.group(3) else len(self.rows)
+        first_col = _column_number(match.group(1))
+        last_col = _column_number(match.group(3) or match.group(1)) if a1 else None
+        with self.spreadsheet.lock:
+            values = [list(r[first_col - 1:last_col]) for r in self.rows[first - 1:last]]
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def append_row(self, values, value_input_option=None, **kwargs):
+        return self.append_rows([values], value_input_option)
+
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        def handler():
+            with self.spreadsheet.lock:
+                first = len(self.rows) + 1
+                self.rows.extend([["" if v is None else str(v) for v in row] for row in values])
+                last = len(self.rows)
+            width = max(len(row) for row in values)
+            return {"updates": {"updatedRange": f"'{self.title}'!A{first}:{rowcol_to_a1(last, width)}"}}
+        return self._call("values:append", handler)
+
+    def update_cell(self, row, col, value):
+        def handler():
+            with self.spreadsheet.lock:
+                target = self.rows[row - 1]
+                target.extend([""] * (col - len(target)))
+                target[col - 1] = str(value)
+        return self._call("values:update", handler)
+
+    def batch_update(self, data, **kwargs):
+        def handler():
+            with self.spreadsheet.lock:
+                for update in data:
+                    row, col = a1_to_rowcol(update["range"])
+                    target = self.rows[row - 1]
+                    target.extend([""] * (col - len(target)))
+                    target[col - 1] = str(update["values"][0][0])
+        return self._call("values:batchUpdate", handler)
+
+    def get_all_records(self):
+        values = self._call("values:get", lambda: self._range(None))
+        header = values[0] if values else []
+        return [dict(zip(header, numericise_all(r + [""] * (len(header) - len(r))))) for r in values[1:]]
+
+    def col_values(self, col):
+        values = self._call("values:get", lambda: self._range(None))
+        return [r[col - 1] for r in values if len(r) >= col]
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, sheets):
+        self.client = client
+        self.lock = threading.Lock()
+        self.worksheets = {title: FakeWorksheet(self, title, rows) for title, rows in sheets.items()}
+
+    def _resolve(self, a1_range):
+        title, _, cells = a1_range.partition("!")
+        title = title.strip("'").replace("''", "'")
+        if title not in self.worksheets:
+            raise APIError(400, f"Unable to parse range: {a1_range}")
+        return self.worksheets[title], cells or None
+
+    def worksheet(self, title):
+        def handler():
+            if title not in self.worksheets:
+                raise WorksheetNotFound(title)
+            return self.worksheets[title]
+        return self.client.http_client.request("get", "spreadsheets:get", params={"title": title}, handler=handler)
+
+    def values_get(self, a1_range, params=None):
+        def handler():
+            worksheet, cells = self._resolve(a1_range)
+            return {"range": a1_range, "values": worksheet._range(cells)}
+        return self.client.http_client.request("get", "values:get", params={"range": a1_range}, handler=handler)
+
+    def values_batch_get(self, ranges, params=None):
+        def handler():
+            value_ranges = []
+            for a1_range in ranges:
+                worksheet, cells = self._resolve(a1_range)
+                value_ranges.append({"range": a1_range, "values": worksheet._range(cells)})
+            return {"valueRanges": value_ranges}
+        return self.client.http_client.request("get", "values:batchGet", params={"ranges": list(ranges)}, handler=handler)
+
+
+class FakeClient:
+    def __init__(self, backend):
+        self.http_client = backend.http_client
+        self.backend = backend
+
+    def open_by_key(self, key):
+        self.http_client.request("get", "spreadsheets:get", handler=lambda: None)
+        return self.backend.spreadsheet
+
+
+class FakeCredentials:
+    service_account_email = "bench@example.iam.gserviceaccount.com"
+
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+
+    @classmethod
+    def from_service_account_info(cls, info, scopes=None):
+        return cls()
+
+    def refresh(self, request):
+        from datetime import datetime, timedelta, timezone
+        self.token = "bench-token"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+
+class FakeSheetsBackend:
+    def __init__(self, sheets=None, latency=0.0, quota_per_minute=None, error_rate=0.0):
+        self.http_client = FakeHTTPClient(latency, quota_per_minute, error_rate)
+        self.spreadsheet = FakeSpreadsheet(self, sheets or DEFAULT_SHEETS)
+
+    def authorize(self, credentials):
+        return FakeClient(self)
+
+    def worksheet_rows(self, title):
+        with self.spreadsheet.lock:
+            return [list(r) for r in self.spreadsheet.worksheets[title].rows]
+
+
+def install(backend):
+    gspread = types.ModuleType("gspread")
+    gspread.authorize = backend.authorize
+    gspread.exceptions = types.ModuleType("gspread.exceptions")
+    gspread.exceptions.APIError = APIError
+    gspread.exceptions.WorksheetNotFound = WorksheetNotFound
+    gspread.utils = types.ModuleType("gspread.utils")
+    gspread.utils.numericise_all = numericise_all
+    gspread.utils.a1_to_rowcol = a1_to_rowcol
+    gspread.utils.rowcol_to_a1 = rowcol_to_a1
+
+    google = types.ModuleType("google")
+    google_auth = types.ModuleType("google.auth")
+    transport = types.ModuleType("google.auth.transport")
+    transport_requests = types.ModuleType("google.auth.transport.requests")
+    transport_requests.Request = lambda *args, **kwargs: None
+    oauth2 = types.ModuleType("google.oauth2")
+    service_account = types.ModuleType("google.oauth2.service_account")
+    service_account.Credentials = FakeCredentials
+    google.auth, google.oauth2 = google_auth, oauth2
+    google_auth.transport, transport.requests = transport, transport_requests
+    oauth2.service_account = service_account
+
+    sys.modules.update({
+        "gspread": gspread,
+        "gspread.exceptions": gspread.exceptions,
+        "gspread.utils": gspread.utils,
+        "google": google,
+        "google.auth": google_auth,
+        "google.auth.transport": transport,
+        "google.auth.transport.requests": transport_requests,
+        "google.oauth2": oauth2,
+        "google.oauth2.service_account": service_account,
+    })
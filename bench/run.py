@@ -0,0 +1,258 @@
+"""Load benchmark for api/index.py against local Sheets and Brevo stand-ins.
+
+    python bench/run.py                          # run, compare with bench/baseline.json
+    python bench/run.py --save-baseline          # record a new baseline
+    python bench/run.py --concurrency 50 --requests 400 --sheets-latency 0.15 --sheets-quota 300
+
+Each scenario drives one route through Flask's test client from a thread pool.
+gspread/google-auth are replaced by bench/fake_sheets.py and Brevo by a local
+HTTP stub, so nothing leaves the machine. Latency percentiles, throughput and
+external calls per request (read from the app's Server-Timing header) are
+reported per route, each the median over --runs repetitions. The exit status
+is 1 if any route's p50, p95 or p99 regresses by more than --tolerance and
+--min-delta-ms against the stored baseline, or it errors or makes more
+external calls per request than it used to.
+
+Only re-record the baseline in a commit of its own that says why the numbers
+moved; a change that makes a route slower should fail here, not rewrite it.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_brevo  # noqa: E402
+import fake_sheets  # noqa: E402
+
+SCENARIOS = ("/", "/vip", "/submit", "/vip-submit", "/subscribe")
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+SUBSCRIBERS = 1000
+VIP_ROSTER = 200
+
+_unique = itertools.count()
+
+
+def build_sheets():
+    sheets = {title: [list(row) for row in rows] for title, rows in fake_sheets.DEFAULT_SHEETS.items()}
+    sheets["Subscribers"] += [["01/01/2026 09:00:00", f"subscriber{i}@example.com", "Active"] for i in range(SUBSCRIBERS)]
+    sheets["Bread Subscriptions"] += [[f"VIP {i}", f"vip{i}@example.com", "Large Loaf (1kg)", "Active"] for i in range(VIP_ROSTER)]
+    return sheets
+
+
+def load_app(backend, brevo, sheets_quota):
+    state_dir = tempfile.mkdtemp(prefix="aiara-bench-")
+    os.environ.update({
+        # Match the app's Sheets scheduler to the fake's quota; unlimited when there is none
+        "SHEETS_QUOTA_PER_MINUTE": str(sheets_quota or 0),
+        "SHEETS_BACKOFF_SECONDS": "0.1",
+        "GOOGLE_SERVICE_ACCOUNT_JSON": "{}",
+        "GOOGLE_SHEET_ID": "bench",
+        "GOOGLE_TOKEN_CACHE_PATH": os.path.join(state_dir, "token.json"),
+        "LOCAL_DB_PATH": os.path.join(state_dir, "bench.sqlite3"),
+        "BREVO_API_URL": brevo.url,
+        "BREVO_API_KEY": "bench",
+        "ADMIN_TOKEN": "bench",
+    })
+    fake_sheets.install(backend)
+    sys.path.insert(0, os.path.join(ROOT, "api"))
+    import index
+    return index
+
+
+def build_request(scenario):
+    n = next(_unique)
+    if scenario == "/submit":
+        return "post", {"data": {
+            "name": f"Bench {n}",
+            "contact": f"customer{n}@example.com",
+            "order_summary": "1x Country Sourdough, 1x Seeded Rye",
+            "order_total": "26.00",
+            "logistics": "Clarksburg Resident (Pickup)",
+            "pickup_window": "9-10am",
+            "join_list": "yes",
+        }}
+    if scenario == "/vip-submit":
+        return "post", {"data": {
+            "name": f"VIP {n % VIP_ROSTER}",
+            "contact": f"vip{n % VIP_ROSTER}@example.com",
+            "order_summary": "1x Country Sourdough",
+            "logistics": "WWS (Pickup)",
+            "wws_pickup_window": "3:15pm",
+        }}
+    if scenario == "/subscribe":
+        return "post", {"data": {"email": f"fan{n}@example.com"}}
+    return "get", {"headers": {"Accept-Encoding": "gzip"}}
+
+
+def parse_server_timing(header):
+    calls = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, *params = entry.split(";")
+        for param in params:
+            if param.startswith("desc="):
+                calls[name] = int(param[len('desc="'):].split()[0])
+    return calls
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(app, scenario, total, concurrency):
+    local = threading.local()
+
+    def one(_):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        method, kwargs = build_request(scenario)
+        started = time.perf_counter()
+        response = getattr(client, method)(scenario, **kwargs)
+        elapsed = time.perf_counter() - started
+        body = response.get_data()
+        ok = response.status_code < 400 and not body.startswith(b"Error:") and b"Connection Error" not in body
+        return elapsed, ok, parse_server_timing(response.headers.get("Server-Timing", ""))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    return {
+        "requests": total,
+        "errors": sum(1 for r in results if not r[1]),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "throughput_rps": round(total / wall, 1),
+        "sheets_calls_per_request": round(sum(r[2].get("sheets", 0) for r in results) / total, 3),
+        "brevo_calls_per_request": round(sum(r[2].get("brevo", 0) for r in results) / total, 3),
+    }
+
+
+def median_run(runs):
+    # Per metric, so one run's stall can't move the result on its own. Errors
+    # are the worst run's: those are never noise.
+    result = {key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]}
+    result["errors"] = max(run["errors"] for run in runs)
+    return result
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        # Relative to the route's own baseline: a cached page going from 0.5 ms to
+        # 5 ms fails just like an order submit going from 100 ms to 1 s.
+        # min_delta_ms only keeps sub-millisecond jitter from tripping it.
+        for key in LATENCY_KEYS:
+            if current[key] > previous[key] * (1 + tolerance) and current[key] - previous[key] > min_delta_ms:
+                regressions.append(f"{scenario}: {key} {previous[key]} -> {current[key]}")
+        for key in ("sheets_calls_per_request", "brevo_calls_per_request"):
+            if current[key] > previous[key] + 0.05:
+                regressions.append(f"{scenario}: {key} {previous[key]} -> {current[key]}")
+        if current["errors"] / current["requests"] > previous["errors"] / previous["requests"] + 0.01:
+            regressions.append(f"{scenario}: errors {previous['errors']}/{previous['requests']} -> {current['errors']}/{current['requests']}")
+    return regressions
+
+
+def print_report(results):
+    columns = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "sheets_calls_per_request", "brevo_calls_per_request", "errors")
+    headers = ("route", "p50 ms", "p95 ms", "p99 ms", "req/s", "sheets/req", "brevo/req", "errors")
+    rows = [[scenario] + [str(result[c]) for c in columns] for scenario, result in results.items()]
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per route")
+    parser.add_argument("--runs", type=int, default=5, help="repetitions per route; the report is the median")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sheets-latency", type=float, default=0.05, help="seconds per fake Sheets call")
+    parser.add_argument("--sheets-quota", type=int, default=None, help="fake Sheets calls per minute before 429s")
+    parser.add_argument("--sheets-error-rate", type=float, default=0.0, help="fraction of Sheets calls failing with 503")
+    parser.add_argument("--brevo-latency", type=float, default=0.1, help="seconds per fake Brevo call")
+    parser.add_argument("--brevo-error-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative latency slowdown before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore latency regressions smaller than this, however large relative to the baseline")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    args = parser.parse_args(argv)
+
+    backend = fake_sheets.FakeSheetsBackend(
+        build_sheets(), args.sheets_latency, args.sheets_quota, args.sheets_error_rate
+    )
+    brevo = fake_brevo.FakeBrevo(args.brevo_latency, args.brevo_error_rate).start()
+    index = load_app(backend, brevo, args.sheets_quota)
+
+    results = {}
+    app_log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with app_log:
+        for scenario in args.scenarios:
+            runs = []
+            for _ in range(args.runs):
+                run_scenario(index.app, scenario, args.warmup, min(args.warmup, args.concurrency) or 1)
+                runs.append(run_scenario(index.app, scenario, args.requests, args.concurrency))
+            results[scenario] = median_run(runs)
+
+        # Let the write-behind paths finish so their calls show up in the totals
+        index.flush_orders()
+        index.inventory.flush()
+        index.drain_outbox()
+    brevo.stop()
+
+    print_report(results)
+    print()
+    print(f"Sheets calls by endpoint: {dict(backend.http_client.calls)}")
+    print(f"Sheets quota errors: {backend.http_client.quota_errors}, injected errors: {backend.http_client.injected_errors}")
+    print(f"Sheets scheduler: {index.sheets_scheduler.stats()}")
+    print(f"Brevo requests: {brevo.requests} ({brevo.recipients} recipients, {brevo.errors} errors, {len(brevo.connections)} connections)")
+    print(f"Orders rows written: {len(backend.worksheet_rows('Orders')) - 1}")
+
+    config = {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "tolerance", "min_delta_ms", "verbose")}
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "scenarios": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print("Warning: baseline was recorded with different settings; comparison may be meaningless.")
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
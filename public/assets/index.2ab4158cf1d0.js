@@ -0,0 +1,39 @@
+const orderForm = document.getElementById('orderForm');
+if (orderForm) {
+orderForm.onsubmit = function() {
+let summary = [];
+let total = 0;
+document.querySelectorAll('.qty-select').forEach(select => {
+let qty = parseInt(select.value);
+if (qty > 0) {
+summary.push(qty + "x " + select.getAttribute('data-name'));
+total += qty * parseFloat(select.getAttribute('data-price'));
+}
+});
+if (summary.length === 0) { alert("Please select at least one loaf!"); return false; }
+document.getElementById('orderSummary').value = summary.join(", ");
+document.getElementById('orderTotal').value = total.toFixed(2);
+document.getElementById('submitBtn').disabled = true;
+document.getElementById('submitBtn').innerText = "Processing...";
+return true;
+};
+}
+function openSubModal(e) {
+e.preventDefault();
+document.getElementById('subModal').style.display = 'flex';
+}
+function closeSubModal() {
+document.getElementById('subModal').style.display = 'none';
+}
+document.querySelectorAll('.faq-question').forEach(button => {
+button.addEventListener('click', () => {
+const faqItem = button.parentElement;
+const faqAnswer = button.nextElementSibling;
+faqItem.classList.toggle('active');
+if (faqItem.classList.contains('active')) {
+faqAnswer.style.maxHeight = faqAnswer.scrollHeight + "px";
+} else {
+faqAnswer.style.maxHeight = 0;
+}
+});
+});
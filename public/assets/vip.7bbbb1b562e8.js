@@ -0,0 +1,12 @@
+document.getElementById('vipForm').onsubmit = function() {
+let summary = [];
+document.querySelectorAll('.qty-select').forEach(select => {
+let qty = parseInt(select.value);
+if (qty > 0) { summary.push(qty + "x " + select.getAttribute('data-name')); }
+});
+if (summary.length === 0) { alert("Please select a loaf!"); return false; }
+document.getElementById('orderSummary').value = summary.join(", ");
+document.getElementById('submitBtn').disabled = true;
+document.getElementById('submitBtn').innerText = "Processing...";
+return true;
+};
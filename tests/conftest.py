@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+# The app reads its config at import time, so point it at throwaway state first
+STATE_DIR = tempfile.mkdtemp(prefix="aiara-tests-")
+os.environ.update({
+    "LOCAL_DB_PATH": os.path.join(STATE_DIR, "test.sqlite3"),
+    "GOOGLE_TOKEN_CACHE_PATH": os.path.join(STATE_DIR, "token.json"),
+    "GOOGLE_SERVICE_ACCOUNT_JSON": "{}",
+    "GOOGLE_SHEET_ID": "tests",
+    "BREVO_API_KEY": "tests",
+    "ADMIN_TOKEN": "tests",
+    "SHEETS_QUOTA_PER_MINUTE": "0",
+})
+
+import fake_brevo  # noqa: E402
+import fake_sheets  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def sheets_backend():
+    backend = fake_sheets.FakeSheetsBackend(
+        {title: [list(row) for row in rows] for title, rows in fake_sheets.DEFAULT_SHEETS.items()}
+    )
+    fake_sheets.install(backend)
+    return backend
+
+
+@pytest.fixture(scope="session")
+def index(sheets_backend):
+    import index as app_module
+    return app_module
+
+
+@pytest.fixture
+def brevo(index, monkeypatch):
+    server = fake_brevo.FakeBrevo().start()
+    monkeypatch.setattr(index, "BREVO_API_URL", server.url)
+    # Request threads keep a connection to the server they last sent through
+    monkeypatch.setattr(index, "_request_brevo", threading.local())
+    yield server
+    server.stop()
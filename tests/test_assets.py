@@ -0,0 +1,49 @@
+import json
+
+
+def test_asset_url_uses_the_hashed_name(index):
+    with index.app.test_request_context():
+        url = index.asset_url("index.css")
+    assert url == f"/assets/{index.asset_manifest['index.css']}"
+
+    response = index.app.test_client().get(url)
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+
+
+def test_unbuilt_asset_is_served_unhashed(index, monkeypatch):
+    monkeypatch.setattr(index, "asset_manifest", {})
+
+    with index.app.test_request_context():
+        assert index.asset_url("index.css") == "/assets/index.css"
+    response = index.app.test_client().get("/assets/index.css")
+
+    assert response.status_code == 200
+    assert "immutable" not in response.headers["Cache-Control"]
+    with open(f"{index.ASSET_SOURCE_DIR}/index.css", "rb") as f:
+        assert response.get_data() == f.read()
+
+
+def test_manifest_entry_without_its_file_is_dropped(index, tmp_path, monkeypatch, capsys):
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps({"index.css": "index.000000000000.css", "vip.css": "vip.111111111111.css"}))
+    (tmp_path / "vip.111111111111.css").write_text("body{}")
+    monkeypatch.setattr(index, "ASSET_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(index, "ASSET_MANIFEST_PATH", str(manifest_path))
+
+    assert index.load_asset_manifest() == {"vip.css": "vip.111111111111.css"}
+    assert "index.000000000000.css is missing" in capsys.readouterr().out
+
+
+def test_missing_manifest_loads_empty(index, tmp_path, monkeypatch):
+    monkeypatch.setattr(index, "ASSET_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+
+    assert index.load_asset_manifest() == {}
+
+
+def test_only_css_and_js_sources_are_served(index, monkeypatch):
+    monkeypatch.setattr(index, "asset_manifest", {})
+    client = index.app.test_client()
+
+    assert client.get("/assets/../api/index.py").status_code == 404
+    assert client.get("/assets/missing.js").status_code == 404
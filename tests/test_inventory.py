@@ -0,0 +1,138 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_sheets
+import pytest
+
+
+@pytest.fixture
+def stock(index, sheets_backend, brevo, monkeypatch):
+    # Fresh ledger and journal over a Menu whose Remaining the test sets; flushes
+    # happen only when a test asks, and no mail workers
+    monkeypatch.setattr(index, "start_outbox_workers", lambda: None)
+    monkeypatch.setattr(index.InventoryLedger, "start_flusher", lambda self: None)
+    with index.local_transaction() as db:
+        db.execute("DELETE FROM inventory_journal")
+        db.execute("DELETE FROM inventory_flushes")
+    monkeypatch.setattr(index, "inventory", index.InventoryLedger())
+    menu = sheets_backend.spreadsheet.worksheets["Menu"]
+    original = [list(row) for row in menu.rows]
+
+    def set_remaining(name, remaining):
+        for row in menu.rows:
+            if row[0] == name:
+                row[3] = str(remaining)
+        index.sheet_cache.invalidate("Menu")
+
+    def remaining(name):
+        return next(int(row[3]) for row in sheets_backend.worksheet_rows("Menu") if row[0] == name)
+
+    set_remaining.remaining = remaining
+    yield set_remaining
+    menu.rows[:] = original
+    index.sheet_cache.invalidate("Menu")
+
+
+def orders_for(sheets_backend, item):
+    return [row for row in sheets_backend.worksheet_rows("Orders") if item in str(row[3])]
+
+
+@pytest.mark.parametrize("summary, lines", [
+    ("2x Country Sourdough, 1x Seeded Rye", [(2, "Country Sourdough"), (1, "Seeded Rye")]),
+    ("1x Olive, Thyme & Sea Salt Focaccia", [(1, "Olive, Thyme & Sea Salt Focaccia")]),
+    ("3x Rye, Caraway, 2x Sandwich Loaf", [(3, "Rye, Caraway"), (2, "Sandwich Loaf")]),
+    ("Surprise me", []),
+])
+def test_parse_order_summary(index, summary, lines):
+    assert index.parse_order_summary(summary) == lines
+
+
+def test_concurrent_submits_never_accept_more_than_stock(index, sheets_backend, stock):
+    stock("Country Sourdough", 5)
+    before = len(orders_for(sheets_backend, "Country Sourdough"))
+
+    def submit(n):
+        return index.app.test_client().post("/submit", data={
+            "name": f"Customer {n}",
+            "contact": f"stock{n}@example.com",
+            "order_summary": "1x Country Sourdough",
+            "order_total": "12.00",
+            "logistics": "Clarksburg Resident (Pickup)",
+            "pickup_window": "9-10am",
+        }).status_code
+
+    with ThreadPoolExecutor(20) as pool:
+        statuses = list(pool.map(submit, range(200)))
+
+    assert statuses.count(302) == 5
+    assert statuses.count(409) == 195
+    assert len(orders_for(sheets_backend, "Country Sourdough")) - before == 5
+    index.inventory.flush()
+    assert stock.remaining("Country Sourdough") == 0
+    assert index.inventory.stats()["oversold"] == {}
+
+
+def test_flush_counts_stock_sold_by_another_instance(index, stock, capsys):
+    stock("Seeded Rye", 5)
+    index.inventory.reserve([(3, "Seeded Rye")])
+    # Meanwhile another instance sells four of the five
+    stock("Seeded Rye", 1)
+
+    index.inventory.flush()
+
+    assert stock.remaining("Seeded Rye") == 0
+    assert index.inventory.stats()["oversold"] == {"Seeded Rye": 2}
+    assert "Inventory Oversold: Seeded Rye" in capsys.readouterr().out
+
+
+def test_released_reservation_leaves_menu_alone(index, stock):
+    stock("Seeded Rye", 10)
+    reservation = index.inventory.reserve([(3, "Seeded Rye")])
+
+    index.inventory.release(reservation)
+
+    assert index.inventory.flush() == 0
+    assert stock.remaining("Seeded Rye") == 10
+
+
+def test_request_flushes_reservations_of_a_recycled_instance(index, stock, monkeypatch):
+    stock("Seeded Rye", 10)
+    index.inventory.reserve([(3, "Seeded Rye")])
+    with index.local_transaction() as db:
+        db.execute("UPDATE inventory_journal SET created_at = ?", (time.time() - index.INVENTORY_FLUSH_SECONDS - 1,))
+    # The instance is recycled before its flusher runs; the next one finds the journal
+    monkeypatch.setattr(index, "inventory", index.InventoryLedger())
+
+    index.app.test_client().get("/unsubscribe")
+
+    assert stock.remaining("Seeded Rye") == 7
+    assert index.inventory.unflushed_since() is None
+
+
+@pytest.mark.parametrize("applied", [True, False])
+def test_ambiguous_write_back_is_applied_once(index, sheets_backend, stock, applied):
+    stock("Seeded Rye", 10)
+    index.inventory.reserve([(3, "Seeded Rye")])
+    sheets_backend.http_client.fail_next("values:batchUpdate", 503, applied=applied)
+
+    with pytest.raises(fake_sheets.APIError):
+        index.inventory.flush()
+    assert index.inventory.available("Seeded Rye") == 7
+    index.inventory.flush()
+
+    assert stock.remaining("Seeded Rye") == 7
+    assert index.inventory.available("Seeded Rye") == 7
+    assert index.inventory.stats()["pending"] == {}
+
+
+def test_rejected_write_back_is_retried(index, sheets_backend, stock):
+    stock("Seeded Rye", 10)
+    index.inventory.reserve([(3, "Seeded Rye")])
+    sheets_backend.http_client.fail_next("values:batchUpdate", 400)
+
+    with pytest.raises(fake_sheets.APIError):
+        index.inventory.flush()
+    assert index.local_db().execute("SELECT COUNT(*) FROM inventory_flushes").fetchone()[0] == 0
+
+    assert index.inventory.flush() == 3
+    assert stock.remaining("Seeded Rye") == 7
@@ -0,0 +1,110 @@
+import json
+import time
+
+import pytest
+
+
+@pytest.fixture
+def orders(index, sheets_backend, monkeypatch):
+    # An empty journal over the session's Orders; retries are left to the test
+    monkeypatch.setattr(index, "start_order_flusher", lambda: None)
+    worksheet = sheets_backend.spreadsheet.worksheets["Orders"]
+    original = [list(row) for row in worksheet.rows]
+    with index.local_transaction() as db:
+        db.execute("DELETE FROM order_journal")
+        db.execute("DELETE FROM order_flushes")
+    yield worksheet
+    worksheet.rows[:] = original
+
+
+def order_row(contact, placed="10/17/2026 09:00:00", summary="1x Seeded Rye"):
+    return [placed, "Customer", contact, summary, "Clarksburg Resident (Pickup)", "9-10am", "No", "", "$14.00", "Pending"]
+
+
+def rows_for(sheets_backend, contact):
+    return [row for row in sheets_backend.worksheet_rows("Orders") if row[2] == contact]
+
+
+def leave_in_journal(index, row):
+    # As if an earlier request on this instance was frozen before it could flush
+    with index.local_transaction() as db:
+        db.execute(
+            "INSERT INTO order_journal (created_at, row) VALUES (?, ?)",
+            (time.time() - index.ORDER_FLUSH_DEADLINE - 1, json.dumps(row))
+        )
+
+
+def test_request_flushes_orders_left_in_the_journal(index, sheets_backend, orders, monkeypatch):
+    row = order_row("leftover@example.com")
+    leave_in_journal(index, row)
+    # A fresh instance doesn't know what an earlier one left behind
+    monkeypatch.setattr(index.order_journal_writes, "settled", None)
+
+    index.app.test_client().get("/unsubscribe")
+
+    assert index.pending_order_count() == 0
+    assert rows_for(sheets_backend, "leftover@example.com") == [row]
+
+
+def test_idle_requests_skip_the_journal_once_it_is_empty(index, orders, monkeypatch):
+    client = index.app.test_client()
+    client.get("/unsubscribe")
+
+    checks = []
+    monkeypatch.setattr(index, "pending_order_count", lambda before=None: checks.append(before) or 0)
+    client.get("/unsubscribe")
+
+    assert checks == []
+
+
+@pytest.mark.parametrize("status", [400, 403])
+def test_rejected_append_withdraws_the_order(index, sheets_backend, orders, status):
+    sheets_backend.http_client.fail_next("values:append", status)
+
+    with pytest.raises(index.OrderNotSaved):
+        index.record_order(order_row("rejected@example.com"))
+
+    assert index.pending_order_count() == 0
+    assert index.local_db().execute("SELECT COUNT(*) FROM order_flushes").fetchone()[0] == 0
+    assert rows_for(sheets_backend, "rejected@example.com") == []
+
+
+def test_ambiguous_append_that_landed_is_not_resent(index, sheets_backend, orders):
+    sheets_backend.http_client.fail_next("values:append", 503, applied=True)
+
+    # The append may have landed, so the order stands and recovery settles it
+    index.record_order(order_row("landed@example.com"))
+    assert index.pending_order_count() == 1
+
+    assert index.flush_orders() == 0
+    assert index.pending_order_count() == 0
+    assert len(rows_for(sheets_backend, "landed@example.com")) == 1
+
+
+def test_ambiguous_append_that_did_not_land_is_resent(index, sheets_backend, orders):
+    # The same customer's last order, for the same loaf, must not pass for this one
+    index.record_order(order_row("again@example.com", placed="10/10/2026 09:00:00"))
+    sheets_backend.http_client.fail_next("values:append", 503)
+
+    index.record_order(order_row("again@example.com"))
+
+    assert index.flush_orders() == 1
+    assert [row[0] for row in rows_for(sheets_backend, "again@example.com")] == [
+        "10/10/2026 09:00:00", "10/17/2026 09:00:00"
+    ]
+
+
+def test_recovery_finds_the_batch_after_orders_was_trimmed(index, sheets_backend, orders):
+    for n in range(5):
+        index.record_order(order_row(f"c{n}@example.com"))
+    # A weekly archive clears the data rows by hand
+    orders.rows[1:] = []
+    sheets_backend.http_client.fail_next("values:append", 503, applied=True)
+
+    index.record_order(order_row("c99@example.com"))
+    index.flush_orders()
+
+    assert len(rows_for(sheets_backend, "c99@example.com")) == 1
+    # Later flushes pick up from where the sheet really ends
+    index.record_order(order_row("c100@example.com"))
+    assert [row[2] for row in sheets_backend.worksheet_rows("Orders")[1:]] == ["c99@example.com", "c100@example.com"]
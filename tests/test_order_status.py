@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def lookups(index, brevo, monkeypatch):
+    # Fresh rate limits and no background flusher or mail workers
+    monkeypatch.setattr(index, "_order_lookup_buckets", {})
+    monkeypatch.setattr(index, "start_order_flusher", lambda: None)
+    monkeypatch.setattr(index, "start_outbox_workers", lambda: None)
+    return index.app.test_client()
+
+
+def last_email(index):
+    row = index.local_db().execute("SELECT payload FROM email_outbox ORDER BY id DESC LIMIT 1").fetchone()
+    return json.loads(row["payload"])
+
+
+def test_order_status_is_emailed_not_shown(index, brevo, lookups):
+    index.record_order([
+        "10/17/2026 09:00:00", "Private Name", "status@example.com", "2x Seeded Rye",
+        "Clarksburg Resident (Pickup)", "10-11am", "No", "Leave by the door", "$28.00", "Pending"
+    ])
+    sent_before = brevo.requests
+
+    page = lookups.post("/my-orders", data={"contact": "Status@example.com"}).get_data(as_text=True)
+
+    assert "2x Seeded Rye" not in page
+    assert "10-11am" not in page
+    assert brevo.requests == sent_before + 1
+    email = last_email(index)
+    assert email["to"] == [{"email": "status@example.com"}]
+    assert "2x Seeded Rye" in email["htmlContent"]
+    assert "10-11am" in email["htmlContent"]
+    assert "Private Name" not in email["htmlContent"]
+
+
+def test_unknown_email_gets_the_same_page(index, brevo, lookups):
+    known = lookups.post("/my-orders", data={"contact": "status@example.com"}).get_data(as_text=True)
+    unknown = lookups.post("/my-orders", data={"contact": "nobody@example.com"}).get_data(as_text=True)
+
+    assert unknown == known.replace("status@example.com", "nobody@example.com")
+    assert "couldn't find any orders" in last_email(index)["htmlContent"]
+
+
+def test_lookups_for_one_email_are_limited_across_clients(index, lookups):
+    statuses = [
+        lookups.post("/my-orders", data={"contact": "target@example.com"},
+                     headers={"X-Forwarded-For": f"203.0.113.{n}"}).status_code
+        for n in range(index.ORDER_LOOKUP_BURST + 1)
+    ]
+
+    assert statuses == [200] * index.ORDER_LOOKUP_BURST + [429]
@@ -0,0 +1,273 @@
+import json
+import time
+
+import fake_brevo
+import pytest
+
+
+@pytest.fixture
+def outbox(index, brevo, monkeypatch):
+    # Deliveries happen only when a test drains; no worker threads racing it
+    monkeypatch.setattr(index, "start_outbox_workers", lambda: None)
+    monkeypatch.setattr(index, "OUTBOX_BACKOFF_SECONDS", 5.0)
+    with index.local_transaction() as db:
+        db.execute("DELETE FROM email_outbox")
+    return index
+
+
+def payload(index, recipient="customer@example.com"):
+    return index.brevo_message("Your order", recipient, "<p>Thanks!</p>")
+
+
+def enqueue(index, recipient="customer@example.com"):
+    # A message whose request couldn't send it, left for the workers
+    now = time.time()
+    with index.local_transaction() as db:
+        message_id = db.execute(
+            "INSERT INTO email_outbox (created_at, label, payload, next_attempt_at) VALUES (?, ?, ?, ?)",
+            (now, "test", json.dumps(payload(index, recipient)), now)
+        ).lastrowid
+    index.outbox_writes.wrote()
+    return message_id
+
+
+def message(index, message_id):
+    return dict(index.local_db().execute("SELECT * FROM email_outbox WHERE id = ?", (message_id,)).fetchone())
+
+
+def make_due(index, message_id):
+    with index.local_transaction() as db:
+        db.execute("UPDATE email_outbox SET next_attempt_at = 0 WHERE id = ?", (message_id,))
+
+
+def latest(index):
+    return message(index, index.local_db().execute("SELECT MAX(id) FROM email_outbox").fetchone()[0])
+
+
+def test_enqueuing_request_sends_its_own_message(outbox, brevo):
+    outbox.enqueue_email(payload(outbox), "test")
+
+    sent = latest(outbox)
+    assert sent["status"] == "sent"
+    assert sent["message_id"] == "<bench-1>"
+    assert sent["attempts"] == 1
+    assert brevo.requests == 1
+
+
+def test_failed_send_is_left_for_the_workers(outbox, brevo):
+    brevo.fail_next(503)
+
+    outbox.enqueue_email(payload(outbox), "test")
+
+    retrying = latest(outbox)
+    assert retrying["status"] == "pending"
+    assert retrying["attempts"] == 1
+    make_due(outbox, retrying["id"])
+    assert outbox.drain_outbox() == 1
+    assert message(outbox, retrying["id"])["status"] == "sent"
+
+
+def test_slow_send_is_cut_short_and_left_for_the_workers(outbox, monkeypatch):
+    slow = fake_brevo.FakeBrevo(latency=1.0).start()
+    monkeypatch.setattr(outbox, "BREVO_API_URL", slow.url)
+    monkeypatch.setattr(outbox, "OUTBOX_SEND_TIMEOUT", 0.1)
+    try:
+        started = time.perf_counter()
+        outbox.enqueue_email(payload(outbox), "test")
+        assert time.perf_counter() - started < 0.5
+    finally:
+        slow.stop()
+
+    retrying = latest(outbox)
+    assert retrying["status"] == "pending"
+    assert "timed out" in retrying["last_error"]
+
+
+def test_overdue_mail_is_counted(outbox, brevo):
+    message_id = enqueue(outbox)
+    with outbox.local_transaction() as db:
+        db.execute("UPDATE email_outbox SET created_at = ? WHERE id = ?", (time.time() - outbox.OUTBOX_OVERDUE_SECONDS - 1, message_id))
+    enqueue(outbox)
+
+    assert outbox.outbox_stats()["overdue"] == 1
+
+
+def test_sent_message_records_brevo_message_id(outbox, brevo):
+    message_id = enqueue(outbox)
+
+    assert outbox.drain_outbox() == 1
+
+    sent = message(outbox, message_id)
+    assert sent["status"] == "sent"
+    assert sent["message_id"] == "<bench-1>"
+    assert sent["attempts"] == 1
+    assert sent["sent_at"] is not None
+    assert sent["last_error"] is None
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_failure_backs_off_then_sends(outbox, brevo, status):
+    message_id = enqueue(outbox)
+    brevo.fail_next(status)
+
+    before = time.time()
+    outbox.drain_outbox()
+    retrying = message(outbox, message_id)
+    assert retrying["status"] == "pending"
+    assert retrying["attempts"] == 1
+    assert str(status) in retrying["last_error"]
+    # First retry waits OUTBOX_BACKOFF_SECONDS, +/- 20% jitter
+    assert before + 4 <= retrying["next_attempt_at"] <= time.time() + 6
+
+    assert outbox.drain_outbox() == 0
+    make_due(outbox, message_id)
+    assert outbox.drain_outbox() == 1
+
+    sent = message(outbox, message_id)
+    assert sent["status"] == "sent"
+    assert sent["attempts"] == 2
+    assert sent["message_id"] == "<bench-2>"
+    assert brevo.requests == 2
+
+
+def test_backoff_doubles_between_attempts(outbox, brevo):
+    message_id = enqueue(outbox)
+    brevo.fail_next(503, 503)
+
+    outbox.drain_outbox()
+    make_due(outbox, message_id)
+    before = time.time()
+    outbox.drain_outbox()
+
+    retrying = message(outbox, message_id)
+    assert retrying["attempts"] == 2
+    assert before + 8 <= retrying["next_attempt_at"] <= time.time() + 12
+
+
+def test_gives_up_after_max_attempts(outbox, brevo, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    message_id = enqueue(outbox)
+    brevo.fail_next(503, 503)
+
+    outbox.drain_outbox()
+    make_due(outbox, message_id)
+    outbox.drain_outbox()
+
+    failed = message(outbox, message_id)
+    assert failed["status"] == "failed"
+    assert failed["attempts"] == 2
+    assert outbox.outbox_stats()["counts"] == {"failed": 1}
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_other_client_errors_fail_without_retry(outbox, brevo, status):
+    message_id = enqueue(outbox)
+    brevo.fail_next(status)
+
+    outbox.drain_outbox()
+    make_due(outbox, message_id)
+
+    assert outbox.drain_outbox() == 0
+    failed = message(outbox, message_id)
+    assert failed["status"] == "failed"
+    assert failed["attempts"] == 1
+    assert str(status) in failed["last_error"]
+    assert brevo.requests == 1
+
+
+def test_expired_lease_is_reclaimed(outbox, brevo):
+    message_id = enqueue(outbox)
+    # A worker claims the message and dies before it can record the result
+    assert outbox._claim_outbox_message()["id"] == message_id
+
+    assert outbox.drain_outbox() == 0
+    with outbox.local_transaction() as db:
+        db.execute(
+            "UPDATE email_outbox SET claimed_at = ? WHERE id = ?",
+            (time.time() - outbox.OUTBOX_LEASE_SECONDS - 1, message_id)
+        )
+    assert outbox.drain_outbox() == 1
+
+    sent = message(outbox, message_id)
+    assert sent["status"] == "sent"
+    assert sent["attempts"] == 2
+    assert brevo.requests == 1
+
+
+def test_kept_alive_connection_is_reused(outbox, brevo):
+    first, second = enqueue(outbox), enqueue(outbox, "someone@example.com")
+
+    assert outbox.drain_outbox() == 2
+
+    assert len(brevo.connections) == 1
+    assert message(outbox, first)["status"] == message(outbox, second)["status"] == "sent"
+
+
+def test_reconnects_when_kept_alive_connection_was_closed(outbox, brevo):
+    brevo.drop_connections = True
+    connection = outbox.BrevoConnection()
+    first = enqueue(outbox)
+    assert outbox.drain_outbox(connection) == 1
+    second = enqueue(outbox, "someone@example.com")
+
+    assert outbox.drain_outbox(connection) == 1
+
+    assert message(outbox, first)["status"] == "sent"
+    sent = message(outbox, second)
+    assert sent["status"] == "sent"
+    # The retry on a fresh connection is part of the same attempt
+    assert sent["attempts"] == 1
+    assert len(brevo.connections) == 2
+    assert brevo.requests == 2
+
+
+def make_stale(index, message_id):
+    with index.local_transaction() as db:
+        db.execute(
+            "UPDATE email_outbox SET next_attempt_at = ? WHERE id = ?",
+            (time.time() - index.OUTBOX_STALE_SECONDS - 1, message_id)
+        )
+
+
+def test_request_sends_mail_the_workers_left_behind(outbox, brevo, monkeypatch):
+    # Nothing has been sent in a while: the workers are frozen or gone
+    monkeypatch.setattr(outbox, "_outbox_last_claim", 0.0)
+    message_id = enqueue(outbox)
+    make_stale(outbox, message_id)
+
+    outbox.app.test_client().get("/unsubscribe")
+
+    assert message(outbox, message_id)["status"] == "sent"
+
+
+def test_request_leaves_a_backlog_to_busy_workers(outbox, brevo, monkeypatch):
+    monkeypatch.setattr(outbox, "_outbox_last_claim", time.time())
+    message_id = enqueue(outbox)
+    make_stale(outbox, message_id)
+
+    outbox.app.test_client().get("/unsubscribe")
+
+    assert message(outbox, message_id)["status"] == "pending"
+    assert brevo.requests == 0
+
+
+def test_request_leaves_fresh_mail_to_the_workers(outbox, brevo, monkeypatch):
+    monkeypatch.setattr(outbox, "_outbox_last_claim", 0.0)
+    message_id = enqueue(outbox)
+
+    outbox.app.test_client().get("/unsubscribe")
+
+    assert message(outbox, message_id)["status"] == "pending"
+    assert brevo.requests == 0
+
+
+def test_idle_requests_skip_the_outbox_once_it_is_empty(outbox, brevo, monkeypatch):
+    monkeypatch.setattr(outbox, "_outbox_last_claim", 0.0)
+    client = outbox.app.test_client()
+    client.get("/unsubscribe")
+
+    checks = []
+    monkeypatch.setattr(outbox, "outbox_backlog", lambda: checks.append(1) or (0, 0))
+    client.get("/unsubscribe")
+
+    assert checks == []
@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_misses_render_a_version_once(index, monkeypatch):
+    renders = []
+
+    def slow_render(template, **context):
+        renders.append(template)
+        time.sleep(0.2)
+        return f"<p>{context['marker']}</p>"
+
+    monkeypatch.setattr(index, "render_template", slow_render)
+    marker = f"single-flight-{time.time()}"
+
+    def request_page(_):
+        with index.app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+            return index.render_cached_page("index.html", "home", marker=marker).get_etag()[0]
+
+    with ThreadPoolExecutor(10) as pool:
+        etags = list(pool.map(request_page, range(10)))
+
+    assert renders == ["index.html"]
+    assert len(set(etags)) == 1
+
+
+def test_failed_render_is_retried_by_a_waiting_request(index, monkeypatch):
+    attempts = []
+    started = threading.Event()
+
+    def flaky_render(template, **context):
+        attempts.append(template)
+        if len(attempts) == 1:
+            started.set()
+            time.sleep(0.2)
+            raise RuntimeError("template blew up")
+        return "<p>ok</p>"
+
+    monkeypatch.setattr(index, "render_template", flaky_render)
+    marker = f"retry-{time.time()}"
+
+    def request_page(_):
+        with index.app.test_request_context("/"):
+            try:
+                return index.render_cached_page("index.html", "home", marker=marker).status_code
+            except RuntimeError:
+                return "error"
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(request_page, 0)
+        started.wait()
+        second = pool.submit(request_page, 1)
+        results = [first.result(), second.result()]
+
+    assert results == ["error", 200]
+    assert len(attempts) == 2
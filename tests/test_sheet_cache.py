@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+class Sheet:
+    # A loader whose answers change on every read, and can be held mid-read
+    def __init__(self):
+        self.reads = []
+        self.reading = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, names):
+        self.reads.append(names)
+        self.reading.set()
+        self.release.wait()
+        return {name: f"{name} v{len(self.reads)}" for name in names}
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(index):
+    sheet = Sheet()
+    cache = index.SheetCache(sheet, 0.05, 60)
+    assert cache.get("Menu") == {"Menu": "Menu v1"}
+    time.sleep(0.1)
+
+    sheet.reading.clear()
+    sheet.release.clear()
+    with ThreadPoolExecutor(5) as pool:
+        results = list(pool.map(lambda _: cache.get("Menu"), range(5)))
+
+    assert results == [{"Menu": "Menu v1"}] * 5
+    assert cache.stale_hits == 5
+    assert sheet.reading.wait(5)
+    assert sheet.reads == [["Menu"], ["Menu"]]
+
+    sheet.release.set()
+    wait_for(lambda: cache.refreshes == 1)
+    assert cache.get("Menu") == {"Menu": "Menu v2"}
+    assert len(sheet.reads) == 2
+
+
+def test_failed_refresh_keeps_serving_the_stale_entry(index):
+    sheet = Sheet()
+    cache = index.SheetCache(sheet, 0.05, 60)
+    cache.get("Menu")
+    time.sleep(0.1)
+
+    cache.loader = lambda names: {}
+    assert cache.get("Menu") == {"Menu": "Menu v1"}
+    wait_for(lambda: cache.refresh_errors == 1)
+
+    assert cache.get("Menu") == {"Menu": "Menu v1"}
+
+
+def test_entry_past_max_stale_waits_for_fresh_data(index):
+    sheet = Sheet()
+    cache = index.SheetCache(sheet, 0.02, 0.05)
+    cache.get("Menu", "Settings")
+    time.sleep(0.1)
+
+    assert cache.get("Menu", "Settings") == {"Menu": "Menu v2", "Settings": "Settings v2"}
+    assert cache.misses == 4
+    assert cache.stale_hits == 0
+    assert cache.refreshes == 0
+
+
+def test_invalidation_during_a_load_discards_its_result(index):
+    sheet = Sheet()
+    cache = index.SheetCache(sheet, 60, 60)
+    sheet.release.clear()
+    with ThreadPoolExecutor(1) as pool:
+        loading = pool.submit(cache.get, "Menu")
+        sheet.reading.wait(5)
+        # Menu was written back after the read started, so what it returns is already old
+        cache.invalidate("Menu")
+        sheet.release.set()
+
+    assert loading.result() == {"Menu": "Menu v1"}
+    assert cache.get("Menu") == {"Menu": "Menu v2"}
+    assert cache.get("Menu") == {"Menu": "Menu v2"}
+    assert len(sheet.reads) == 2
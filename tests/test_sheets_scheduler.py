@@ -0,0 +1,153 @@
+import threading
+import time
+
+import fake_sheets
+import pytest
+
+
+@pytest.fixture
+def scheduler(index, monkeypatch):
+    monkeypatch.setattr(index, "SHEETS_BACKOFF_SECONDS", 0.001)
+    return index.SheetsScheduler(0, 10, 3)
+
+
+class Sheets:
+    # A send() that records each call and answers from a script of statuses
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, method, endpoint, params=None):
+        self.calls.append((method, params))
+        self.release.wait()
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status >= 400:
+            raise fake_sheets.APIError(status, "scripted")
+        return {"endpoint": endpoint, "params": params}
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def in_threads(count, target):
+    results = [None] * count
+
+    def run(n):
+        try:
+            results[n] = target()
+        except Exception as e:
+            results[n] = e
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_identical_gets_in_flight_share_one_call(scheduler):
+    sheets = Sheets()
+    sheets.release.clear()
+    threads, results = in_threads(5, lambda: scheduler.request(sheets, "get", "values:get", params={"range": "Menu"}))
+    wait_for(lambda: scheduler.counts["coalesced"] == 4)
+    sheets.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(sheets.calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_followers_share_the_leaders_failure_then_start_afresh(scheduler):
+    sheets = Sheets(400)
+    sheets.release.clear()
+    threads, results = in_threads(3, lambda: scheduler.request(sheets, "get", "values:get", params={"range": "Menu"}))
+    wait_for(lambda: scheduler.counts["coalesced"] == 2)
+    sheets.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(sheets.calls) == 1
+    assert all(isinstance(result, fake_sheets.APIError) for result in results)
+    assert scheduler.request(sheets, "get", "values:get", params={"range": "Menu"})["params"] == {"range": "Menu"}
+    assert len(sheets.calls) == 2
+
+
+def test_different_gets_are_not_coalesced(scheduler):
+    sheets = Sheets()
+
+    scheduler.request(sheets, "get", "values:get", params={"range": "Menu"})
+    scheduler.request(sheets, "get", "values:get", params={"range": "Settings"})
+
+    assert len(sheets.calls) == 2
+    assert scheduler.counts["coalesced"] == 0
+
+
+def test_writes_are_served_before_queued_reads(index):
+    # One token every 0.2s after the first, so requests queue for their turn
+    scheduler = index.SheetsScheduler(300, 1, 0)
+    sheets = Sheets()
+    scheduler.request(sheets, "get", "values:get", params={"range": "first"})
+
+    waiting, _ = in_threads(1, lambda: scheduler.request(sheets, "get", "values:get", params={"range": "waiting"}))
+    time.sleep(0.05)
+    queued, _ = in_threads(1, lambda: scheduler.request(sheets, "get", "values:get", params={"range": "queued"}))
+    time.sleep(0.05)
+    write, _ = in_threads(1, lambda: scheduler.request(sheets, "post", "values:append", params={"range": "write"}))
+    for thread in waiting + queued + write:
+        thread.join()
+
+    order = [params["range"] for _, params in sheets.calls]
+    assert order[0] == "first"
+    assert order[-1] == "queued"
+
+
+def test_write_is_retried_on_429(scheduler):
+    sheets = Sheets(429, 429)
+
+    assert scheduler.request(sheets, "post", "values:append")["endpoint"] == "values:append"
+
+    assert len(sheets.calls) == 3
+    assert scheduler.counts["retries"] == 2
+
+
+@pytest.mark.parametrize("status", [500, 503])
+def test_write_is_not_retried_on_5xx(scheduler, status):
+    # It may have been applied; the caller decides what to do about it
+    sheets = Sheets(status)
+
+    with pytest.raises(fake_sheets.APIError):
+        scheduler.request(sheets, "post", "values:append")
+
+    assert len(sheets.calls) == 1
+
+
+def test_read_is_retried_on_5xx(scheduler):
+    sheets = Sheets(503, 500)
+
+    assert scheduler.request(sheets, "get", "values:get", params={"range": "Menu"})["params"] == {"range": "Menu"}
+
+    assert len(sheets.calls) == 3
+
+
+def test_read_gives_up_after_max_retries(scheduler):
+    sheets = Sheets(*[503] * 10)
+
+    with pytest.raises(fake_sheets.APIError):
+        scheduler.request(sheets, "get", "values:get", params={"range": "Menu"})
+
+    assert len(sheets.calls) == scheduler.max_retries + 1
+
+
+def test_read_is_not_retried_on_other_4xx(scheduler):
+    sheets = Sheets(400)
+
+    with pytest.raises(fake_sheets.APIError):
+        scheduler.request(sheets, "get", "values:get", params={"range": "Menu"})
+
+    assert len(sheets.calls) == 1
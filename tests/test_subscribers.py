@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def subscribers(index, sheets_backend):
+    worksheet = sheets_backend.spreadsheet.worksheets["Subscribers"]
+    original = [list(row) for row in worksheet.rows]
+    index.subscriber_index.invalidate()
+    yield worksheet
+    worksheet.rows[:] = original
+    index.subscriber_index.invalidate()
+
+
+def status_of(worksheet, email):
+    return [row[2] for row in worksheet.rows if row[1] == email]
+
+
+def test_unsubscribe_rechecks_a_row_that_moved(index, subscribers):
+    for name in ("first", "second", "third"):
+        assert index.add_subscriber(f"{name}@example.com", datetime.now())
+    # Someone tidies up the sheet by hand; every row after it shifts up
+    del subscribers.rows[1]
+
+    assert index.unsubscribe_subscriber("third@example.com")
+
+    assert status_of(subscribers, "third@example.com") == ["Unsubscribed"]
+    assert status_of(subscribers, "second@example.com") == ["Active"]
+    assert index.subscriber_index.get("third@example.com")["status"] == "Unsubscribed"
+
+
+def test_unsubscribe_finds_a_row_the_append_did_not_report(index, subscribers, monkeypatch):
+    monkeypatch.setattr(index, "appended_row", lambda response: None)
+    assert index.add_subscriber("unreported@example.com", datetime.now())
+
+    assert index.unsubscribe_subscriber("unreported@example.com")
+
+    assert status_of(subscribers, "unreported@example.com") == ["Unsubscribed"]
+
+
+def test_unsubscribe_skips_an_email_that_is_gone(index, subscribers):
+    assert index.add_subscriber("removed@example.com", datetime.now())
+    del subscribers.rows[-1]
+
+    assert not index.unsubscribe_subscriber("removed@example.com")
+    assert all(row[2] != "Unsubscribed" for row in subscribers.rows[1:])
@@ -0,0 +1,44 @@
+import pytest
+
+
+@pytest.fixture
+def roster(index, sheets_backend, brevo, monkeypatch):
+    monkeypatch.setattr(index, "start_order_flusher", lambda: None)
+    monkeypatch.setattr(index, "start_outbox_workers", lambda: None)
+    worksheet = sheets_backend.spreadsheet.worksheets["Bread Subscriptions"]
+    original = [list(row) for row in worksheet.rows]
+    worksheet.rows += [
+        ["Active VIP", "active@example.com", "Large Loaf (1kg)", "Active"],
+        ["Paused VIP", "paused@example.com", "Small Loaf (650g)", "Paused"],
+    ]
+    index.vip_index.invalidate()
+    yield worksheet
+    worksheet.rows[:] = original
+    index.vip_index.invalidate()
+
+
+def vip_order(index, contact):
+    return index.app.test_client().post("/vip-submit", data={
+        "name": "VIP",
+        "contact": contact,
+        "order_summary": "1x Country Sourdough",
+        "logistics": "WWS (Pickup)",
+        "wws_pickup_window": "3:15pm",
+    })
+
+
+def vip_orders(sheets_backend, contact):
+    return [row for row in sheets_backend.worksheet_rows("Orders") if row[2] == contact]
+
+
+def test_active_subscriber_orders_with_their_loaf_size(index, sheets_backend, roster):
+    assert vip_order(index, "Active@example.com").status_code == 302
+
+    assert [row[3] for row in vip_orders(sheets_backend, "active@example.com")] == ["1x Country Sourdough [Large Loaf (1kg)]"]
+
+
+@pytest.mark.parametrize("contact", ["paused@example.com", "stranger@example.com"])
+def test_only_active_subscribers_can_order(index, sheets_backend, roster, contact):
+    assert vip_order(index, contact).status_code == 403
+
+    assert vip_orders(sheets_backend, contact) == []
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def full_room(index, monkeypatch):
+    # A one-slot room on the app, with that slot taken
+    room = index.WaitingRoom(1, 20, 30)
+    monkeypatch.setattr(index, "order_admission", room)
+    monkeypatch.setattr(index, "ADMISSION_WAIT_SECONDS", 0)
+    assert room.enter() == (True, None)
+    return room
+
+
+def queue(room, count):
+    tickets = []
+    for _ in range(count):
+        admitted, ticket = room.enter()
+        assert not admitted
+        tickets.append(ticket)
+    return tickets
+
+
+def test_leave_promotes_the_longest_waiting_ticket(index):
+    room = index.WaitingRoom(1, 20, 30)
+    room.enter()
+    first, second = queue(room, 2)
+    assert room.status(second) == {"admitted": False, "position": 2}
+
+    room.leave()
+
+    assert room.status(first) == {"admitted": True, "position": 0}
+    assert room.status(second) == {"admitted": False, "position": 1}
+    # The held slot stays with its ticket; nobody else walks in
+    late, = queue(room, 1)
+    assert room.status(late) == {"admitted": False, "position": 2}
+    assert room.enter(second) == (False, second)
+    assert room.enter(first) == (True, None)
+
+    room.leave()
+
+    assert room.status(second) == {"admitted": True, "position": 0}
+
+
+def test_unclaimed_slot_is_given_back(index):
+    room = index.WaitingRoom(1, 0.1, 30)
+    room.enter()
+    ticket, = queue(room, 1)
+    room.leave()
+    assert room.status(ticket)["admitted"]
+
+    time.sleep(0.2)
+
+    assert room.status(ticket) is None
+    assert room.enter() == (True, None)
+    assert room.stats()["unclaimed"] == 1
+
+
+def test_ticket_that_stops_polling_loses_its_place(index):
+    room = index.WaitingRoom(1, 20, 0.2)
+    room.enter()
+    gone, polling = queue(room, 2)
+
+    time.sleep(0.12)
+    room.status(polling)
+    time.sleep(0.12)
+
+    assert room.status(gone) is None
+    assert room.status(polling) == {"admitted": False, "position": 1}
+    assert room.stats()["abandoned"] == 1
+
+
+def test_unknown_ticket_is_told_to_rejoin(index, full_room):
+    client = index.app.test_client()
+
+    status = client.get("/waiting-room/from-another-instance").get_json()
+    assert status["expired"] and not status["admitted"]
+
+    # The resubmitted form joins the back of the line with a new ticket
+    response = client.post("/submit", data={"name": "Late", "ticket": "from-another-instance"})
+    assert response.status_code == 202
+    new_ticket, = list(full_room._waiting)
+    assert new_ticket != "from-another-instance"
+    assert f'name="ticket" value="{new_ticket}"' in response.get_data(as_text=True)
+    assert client.get(f"/waiting-room/{new_ticket}").get_json()["position"] == 1
+
+
+def test_menu_is_served_from_the_last_render_while_orders_queue(index, full_room, monkeypatch):
+    client = index.app.test_client()
+    full_room.leave()
+    rendered = client.get("/")
+    assert rendered.headers["Cache-Control"] == index.PAGE_CACHE_CONTROL
+    full_room.enter()
+    queue(full_room, 1)
+    assert full_room.busy()
+
+    loads = []
+    monkeypatch.setattr(index, "get_menu_page_data", lambda: loads.append(1))
+    shed = client.get("/")
+
+    assert loads == []
+    assert shed.get_data() == rendered.get_data()
+    assert shed.headers["Cache-Control"] == index.PAGE_CACHE_CONTROL_SHED